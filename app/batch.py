@@ -0,0 +1,172 @@
+"""
+Offline batch session builder.
+
+    python -m app.batch COURSES_DIR_OR_MANIFEST [--minutes 30] [--workers 4]
+
+A directory is read as one course per subdirectory (subdirectory name = session
+name). Note files go straight inside; a file whose name starts with "syllabus"
+is used as the syllabus. A manifest is a JSON list:
+
+    [{"name": "Econ — Week 3", "notes": ["a.md", "b.pdf"], "minutes": 45,
+      "syllabus": "syllabus.txt"}]
+
+Sessions go through the same pipeline as POST /start (app.pipeline), exam
+focus and MCQ pools included. Runs fully offline: the LLM path is switched off
+in every worker. Progress is kept in a JSON file so an interrupted run picks
+up where it stopped. Course names must be unique, ignoring case.
+"""
+import os, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Tuple
+
+from .parsers import read_docs
+from .pipeline import build_session as build_pipeline_session, read_syllabus
+from .models import Session
+from .storage import save_session, save_fragments, name_taken, load_exams, migrate_flat_layout, UPLOADS
+
+NOTE_EXTS = (".md", ".markdown", ".txt", ".pdf", ".pptx")
+DEFAULT_PROGRESS = os.path.join(UPLOADS, "batch_progress.json")
+
+def _courses_from_dir(root: str, minutes: int) -> List[Dict]:
+    courses = []
+    for name in sorted(os.listdir(root)):
+        d = os.path.join(root, name)
+        if not os.path.isdir(d):
+            continue
+        notes, syllabus = [], None
+        for fn in sorted(os.listdir(d)):
+            p = os.path.join(d, fn)
+            if not os.path.isfile(p):
+                continue
+            if fn.lower().startswith("syllabus"):
+                syllabus = p
+            elif os.path.splitext(fn)[1].lower() in NOTE_EXTS:
+                notes.append(p)
+        courses.append({"name": name, "notes": notes, "minutes": minutes, "syllabus": syllabus})
+    return courses
+
+def _courses_from_manifest(path: str, minutes: int) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    rel = lambda p: p if os.path.isabs(p) else os.path.join(base, p)
+    courses = []
+    for it in items:
+        courses.append({
+            "name": it["name"].strip(),
+            "notes": [rel(p) for p in it.get("notes", [])],
+            "minutes": int(it.get("minutes", minutes)),
+            "syllabus": rel(it["syllabus"]) if it.get("syllabus") else None,
+        })
+    return courses
+
+def load_courses(src: str, minutes: int = 30) -> List[Dict]:
+    courses = _courses_from_dir(src, minutes) if os.path.isdir(src) else _courses_from_manifest(src, minutes)
+    seen, dupes = set(), []
+    for c in courses:
+        key = c["name"].lower()  # same rule as storage.name_taken
+        if key in seen:
+            dupes.append(c["name"])
+        seen.add(key)
+    if dupes:
+        raise ValueError(f"duplicate course names: {', '.join(dupes)}")
+    return courses
+
+def build_session(name: str, note_paths: List[str], minutes: int = 30,
+                  syllabus_path: str | None = None) -> Tuple[Session, List[str]]:
+    """POST /start's pipeline, minus the upload handling. Returns the session and its fragments."""
+    docs = read_docs(note_paths)
+    if not any((t or "").strip() for _, t in docs):
+        raise ValueError("notes appear empty or unreadable")
+    syllabus_topics = read_syllabus(syllabus_path) if syllabus_path else []
+    return build_pipeline_session(name, docs, minutes, syllabus_topics, exams=load_exams())
+
+def _init_worker():
+    # keep workers off the network: llm.available() is False without a key
+    os.environ.pop("OPENAI_API_KEY", None)
+
+def _run_course(course: Dict) -> Dict:
+    t0 = time.perf_counter()
+    try:
+        sess, frag_texts = build_session(course["name"], course["notes"], course["minutes"], course.get("syllabus"))
+        save_session(sess)
+        save_fragments(sess.id, frag_texts)
+        return {"name": course["name"], "ok": True, "id": sess.id, "blocks": len(sess.blocks),
+                "seconds": round(time.perf_counter() - t0, 3)}
+    except Exception as e:
+        return {"name": course["name"], "ok": False, "error": str(e),
+                "seconds": round(time.perf_counter() - t0, 3)}
+
+def _load_progress(path: str) -> Dict[str, Dict]:
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        try:
+            return json.load(f)
+        except Exception:
+            return {}
+
+def _save_progress(path: str, progress: Dict[str, Dict]):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(progress, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def run_batch(courses: List[Dict], workers: int = 4, progress_path: str = DEFAULT_PROGRESS) -> List[Dict]:
+    progress = _load_progress(progress_path)
+    todo = []
+    for c in courses:
+        done = progress.get(c["name"])
+        if done and done.get("ok"):
+            continue  # resumed: already built in an earlier run
+        if name_taken(c["name"]):
+            progress[c["name"]] = {"name": c["name"], "ok": False, "error": "session name already exists", "seconds": 0}
+            continue
+        if not c["notes"]:
+            progress[c["name"]] = {"name": c["name"], "ok": False, "error": "no note files", "seconds": 0}
+            continue
+        todo.append(c)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker) as pool:
+        futs = [pool.submit(_run_course, c) for c in todo]
+        for fut in as_completed(futs):
+            res = fut.result()
+            results.append(res)
+            progress[res["name"]] = res
+            _save_progress(progress_path, progress)  # after every course, so a crash loses nothing
+            status = f"ok  {res['id']}" if res["ok"] else f"ERR {res['error']}"
+            print(f"[{res['seconds']:8.2f}s] {status}  {res['name']}", flush=True)
+    _save_progress(progress_path, progress)
+    return results
+
+def _report(courses: List[Dict], progress: Dict[str, Dict], wall: float):
+    rows = [progress[c["name"]] for c in courses if c["name"] in progress]
+    ok = [r for r in rows if r.get("ok")]
+    print()
+    print(f"{'seconds':>9}  {'blocks':>6}  course")
+    for r in sorted(rows, key=lambda r: -r.get("seconds", 0)):
+        blocks = r.get("blocks", "-") if r.get("ok") else "ERR"
+        print(f"{r.get('seconds', 0):9.2f}  {blocks:>6}  {r['name']}")
+    cpu = sum(r.get("seconds", 0) for r in ok)
+    print(f"\n{len(ok)}/{len(courses)} built, {cpu:.2f}s build time, {wall:.2f}s wall")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m app.batch", description="Build sessions offline from a directory or manifest of courses.")
+    ap.add_argument("source", help="directory with one subdirectory per course, or a JSON manifest")
+    ap.add_argument("--minutes", type=int, default=30, help="default session length")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--progress", default=DEFAULT_PROGRESS, help="resume file (delete it to rebuild everything)")
+    args = ap.parse_args(argv)
+
+    migrate_flat_layout()  # name_taken only sees migrated sessions
+    try:
+        courses = load_courses(args.source, args.minutes)
+    except ValueError as e:
+        ap.error(str(e))
+    t0 = time.perf_counter()
+    run_batch(courses, workers=args.workers, progress_path=args.progress)
+    _report(courses, _load_progress(args.progress), time.perf_counter() - t0)
+
+if __name__ == "__main__":
+    main()
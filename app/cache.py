@@ -0,0 +1,30 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """Small thread-safe LRU map for per-session caches (sync routes share them across threads)."""
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,148 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from .models import Session
+from . import llm
+from .cache import LRUCache
+
+# a syllabus item counts as covered once a covered block scores at least this
+COVERED_AT = 0.2
+
+def _vectorizer():
+    return TfidfVectorizer(stop_words="english", ngram_range=(1, 2), sublinear_tf=True)
+
+def _fingerprint(sess: Session):
+    return (tuple(sess.syllabus_topics),
+            tuple((b.id, b.title, len(b.fragments)) for b in sess.blocks))
+
+class CoverageIndex:
+    """
+    Syllabus x block similarity for one session, computed once.
+    Each block is scored by its best match among its title and fragments, so
+    coverage is just a max over the covered columns, taken per call from the
+    caller's session (the index itself holds no covered state).
+    """
+    def __init__(self, sess: Session):
+        self.fingerprint = _fingerprint(sess)
+        self.syllabus = [s for s in sess.syllabus_topics if s.strip()]
+        self.block_ids = [b.id for b in sess.blocks]
+        self.titles = [b.title for b in sess.blocks]
+        self.col = {bid: j for j, bid in enumerate(self.block_ids)}
+        self.scores = np.zeros((len(self.syllabus), len(self.block_ids)), dtype=np.float32)
+        if self.syllabus and self.block_ids:
+            units, owner = [], []
+            for j, b in enumerate(sess.blocks):
+                for t in [b.title] + [f.text for f in b.fragments]:
+                    units.append(t)
+                    owner.append(j)
+            try:
+                X = _vectorizer().fit_transform(self.syllabus + units)
+                sims = cosine_similarity(X[:len(self.syllabus)], X[len(self.syllabus):])
+                owner = np.asarray(owner)
+                for j in range(len(self.block_ids)):
+                    self.scores[:, j] = sims[:, owner == j].max(axis=1)
+            except ValueError:
+                pass  # empty vocabulary (only stop words): everything stays 0
+        self.scores.setflags(write=False)  # shared across request threads: read only
+
+    def covered_mask(self, sess: Session) -> np.ndarray:
+        covered = np.zeros(len(self.block_ids), dtype=bool)
+        for b in sess.blocks:
+            j = self.col.get(b.id)
+            if j is not None:
+                covered[j] = b.covered
+        return covered
+
+    def coverage(self, covered: np.ndarray) -> np.ndarray:
+        """Per syllabus item, its best score among the covered blocks."""
+        if not covered.any():
+            return np.zeros(len(self.syllabus), dtype=np.float32)
+        return self.scores[:, covered].max(axis=1)
+
+    def status(self, covered: np.ndarray) -> List[Tuple[str, float, bool]]:
+        cov = self.coverage(covered)
+        return [(t, float(c), bool(c >= COVERED_AT)) for t, c in zip(self.syllabus, cov)]
+
+    def missed(self, covered: np.ndarray, k: int = 3) -> List[Dict]:
+        """Uncovered syllabus items, those with the most material in the notes first."""
+        out = []
+        cov = self.coverage(covered)
+        pending = ~covered
+        for i in np.argsort(-self.scores.max(axis=1, initial=0), kind="stable"):
+            if cov[i] >= COVERED_AT:
+                continue
+            row = np.where(pending, self.scores[i], -1.0)
+            j = int(row.argmax()) if row.size else -1
+            if j >= 0 and row[j] >= COVERED_AT:
+                why = f"Not covered yet; best match in your notes is \"{self.titles[j]}\"."
+            else:
+                why = "Not covered yet and nothing in the notes matches it closely."
+            out.append({"topic": self.syllabus[i], "why": why, "score": round(float(cov[i]), 3)})
+            if len(out) >= k:
+                break
+        return out
+
+    def block_order(self) -> List[str]:
+        """Block ids in syllabus order; blocks matching nothing keep their order at the end."""
+        if not self.syllabus:
+            return list(self.block_ids)
+        best = self.scores.argmax(axis=0)
+        hit = self.scores.max(axis=0) >= COVERED_AT
+        matched = sorted((j for j in range(len(self.block_ids)) if hit[j]), key=lambda j: (best[j], j))
+        return [self.block_ids[j] for j in matched] + [self.block_ids[j] for j in range(len(self.block_ids)) if not hit[j]]
+
+# Only the similarity scores are cached; covered flags always come from the
+# session the caller loaded, so concurrent requests can't leave stale coverage.
+_INDEX = LRUCache(maxsize=256)
+
+def get_index(sess: Session) -> CoverageIndex:
+    """Cached per session; rebuilt only when blocks or syllabus change."""
+    fp = _fingerprint(sess)
+    idx = _INDEX.get(sess.id)
+    if idx is None or idx.fingerprint != fp:
+        idx = CoverageIndex(sess)
+        _INDEX.put(sess.id, idx)
+    return idx
+
+def forget(sid: str):
+    _INDEX.pop(sid)
+
+def syllabus_status(sess: Session) -> List[Tuple[str, float, bool]]:
+    idx = get_index(sess)
+    return idx.status(idx.covered_mask(sess))
+
+def block_order(sess: Session) -> List[str]:
+    return get_index(sess).block_order()
+
+def missed_topics(sess: Session, k: int = 3, use_llm: bool = False) -> List[Dict]:
+    """Local answer by default; the LLM is only asked when requested and configured."""
+    idx = get_index(sess)
+    local = idx.missed(idx.covered_mask(sess), k)
+    if use_llm and llm.available():
+        try:
+            res = llm.missed_topics(sess.syllabus_topics, [b.title for b in sess.blocks if b.covered]) or []
+            res = [r for r in res if isinstance(r, dict) and r.get("topic")]
+            if res:
+                return res[:k]
+        except Exception:
+            pass
+    return local
+
+def order_topics(topics: List[str], syllabus_topics: List[str]) -> List[str]:
+    """Like order_by_syllabus, but matches on TF-IDF similarity instead of exact strings."""
+    syllabus = [s for s in syllabus_topics if s.strip()]
+    if not syllabus or not topics:
+        return topics
+    try:
+        X = _vectorizer().fit_transform(syllabus + topics)
+    except ValueError:
+        return topics
+    sims = cosine_similarity(X[len(syllabus):], X[:len(syllabus)])
+    exact = {s.strip().lower(): k for k, s in enumerate(syllabus)}
+    for i, t in enumerate(topics):
+        if t.lower() in exact:
+            sims[i, exact[t.lower()]] = 1.0
+    best, hit = sims.argmax(axis=1), sims.max(axis=1) >= COVERED_AT
+    matched = sorted((i for i in range(len(topics)) if hit[i]), key=lambda i: (best[i], i))
+    return [topics[i] for i in matched] + [topics[i] for i in range(len(topics)) if not hit[i]]
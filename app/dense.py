@@ -0,0 +1,130 @@
+"""
+Dense LSA vectors + an IVF (inverted-file) index over a session's fragments.
+
+TF-IDF -> truncated SVD -> unit-length float32 rows. Rows are grouped into
+k-means partitions; a query only scores the rows in its nearest `nprobe`
+partitions. numpy/scikit-learn only, nothing to download.
+
+    python -m app.dense path/to/many/notes/*.md
+
+benchmarks recall@k and latency against exact sparse TF-IDF scoring (the
+planner's FragmentIndex). Give it a large set of distinct notes: repeated
+fragments are dropped, since copies make both recall and timing meaningless.
+The app only uses this index when BLANQO_DENSE_MIN_FRAGMENTS is set (see
+planner.py), which is worth doing only if this shows it winning.
+"""
+import time, argparse
+import numpy as np
+from typing import List
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.cluster import KMeans
+
+class DenseIndex:
+    def __init__(self, texts: List[str], dims: int = 128, nlist: int | None = None, nprobe: int | None = None, seed: int = 0):
+        self.vec = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+        X = self.vec.fit_transform(texts)
+        dims = max(1, min(dims, X.shape[0] - 1, X.shape[1] - 1))
+        self.svd = TruncatedSVD(n_components=dims, random_state=seed)
+        self.vectors = self._unit(self.svd.fit_transform(X))
+
+        n = len(texts)
+        self.nlist = nlist or max(1, int(np.sqrt(n)))
+        self.nprobe = min(self.nlist, nprobe or max(1, self.nlist // 4))
+        if self.nlist > 1:
+            km = KMeans(n_clusters=self.nlist, n_init=1, random_state=seed).fit(self.vectors)
+            self.centroids = self._unit(km.cluster_centers_)
+            labels = km.labels_
+        else:
+            self.centroids = np.zeros((1, self.vectors.shape[1]), dtype=np.float32)
+            labels = np.zeros(n, dtype=int)
+        self.lists = [np.flatnonzero(labels == c) for c in range(self.nlist)]
+
+    @staticmethod
+    def _unit(M) -> np.ndarray:
+        M = np.asarray(M, dtype=np.float32)
+        norms = np.linalg.norm(M, axis=1, keepdims=True)
+        return M / np.where(norms == 0, 1, norms)
+
+    def embed(self, queries: List[str]) -> np.ndarray:
+        return self._unit(self.svd.transform(self.vec.transform(queries)))
+
+    def search(self, query: str, k: int = 3, nprobe: int | None = None) -> List[int]:
+        """Row indices of the top-k fragments for query, best first."""
+        q = self.embed([query])[0]
+        probe = min(self.nlist, nprobe or self.nprobe)
+        k = min(k, len(self.vectors))
+        if probe >= self.nlist:
+            cand = np.arange(len(self.vectors))
+        else:
+            # nearest `probe` partitions, then further ones until there are k candidates
+            near = np.argsort(-(self.centroids @ q))
+            lists = [self.lists[c] for c in near[:probe]]
+            size = sum(len(l) for l in lists)
+            for c in near[probe:]:
+                if size >= k:
+                    break
+                lists.append(self.lists[c])
+                size += len(self.lists[c])
+            cand = np.concatenate(lists)
+        if cand.size == 0 or k <= 0:
+            return []
+        sims = self.vectors[cand] @ q
+        k = min(k, cand.size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        return [int(i) for i in cand[top[np.argsort(-sims[top])]]]
+
+def build_index(texts: List[str], **kw) -> DenseIndex | None:
+    """None when there are too few fragments for an SVD to mean anything."""
+    if len(texts) < 3:
+        return None
+    try:
+        return DenseIndex(texts, **kw)
+    except ValueError:
+        return None  # empty vocabulary
+
+def benchmark(texts: List[str], queries: List[str], k: int = 6, dims: int = 128, nprobe: int | None = None):
+    from .planner import FragmentIndex
+    t0 = time.perf_counter()
+    sparse = FragmentIndex(texts)
+    sparse_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    idx = DenseIndex(texts, dims=dims, nprobe=nprobe)
+    build = time.perf_counter() - t0
+
+    def timed(fn):
+        t = time.perf_counter()
+        res = [fn(q) for q in queries]
+        return res, (time.perf_counter() - t) / len(queries) * 1000
+
+    exact, exact_ms = timed(lambda q: sparse.search(q, k))
+    flat, flat_ms = timed(lambda q: idx.search(q, k, nprobe=idx.nlist))
+    ivf, ivf_ms = timed(lambda q: idx.search(q, k))
+
+    def recall(got):
+        return np.mean([len(set(g) & set(e)) / max(1, len(e)) for g, e in zip(got, exact)])
+
+    print(f"{len(texts)} distinct fragments, {sparse.X.shape[1]} terms -> {idx.vectors.shape[1]} dims "
+          f"({idx.vectors.nbytes / 1e6:.1f} MB float32), {idx.nlist} lists, nprobe {idx.nprobe}")
+    print(f"{'method':<14} {'build s':>8} {'ms/query':>9} {'recall@' + str(k):>10}")
+    print(f"{'sparse exact':<14} {sparse_build:>8.2f} {exact_ms:>9.3f} {1.0:>10.3f}")
+    print(f"{'dense flat':<14} {build:>8.2f} {flat_ms:>9.3f} {recall(flat):>10.3f}")
+    print(f"{'dense ivf':<14} {build:>8.2f} {ivf_ms:>9.3f} {recall(ivf):>10.3f}")
+
+def main(argv=None):
+    from .parsers import read_docs
+    from .planner import chunk_fragments, extract_topics
+    ap = argparse.ArgumentParser(prog="python -m app.dense", description="Recall/latency of the dense index vs exact sparse scoring.")
+    ap.add_argument("notes", nargs="+", help="distinct note files; the more the better")
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--dims", type=int, default=128)
+    ap.add_argument("--nprobe", type=int)
+    args = ap.parse_args(argv)
+
+    docs = read_docs(args.notes)
+    texts = list(dict.fromkeys(f for name, text in docs for f in chunk_fragments(name, text)))
+    queries = extract_topics([t for _, t in docs], cap=50) + texts[:: max(1, len(texts) // 50)]
+    benchmark(texts, queries, k=args.k, dims=args.dims, nprobe=args.nprobe)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Local stand-in for the OpenAI chat completions API, for trying the MCQ stream
+without a network or a key:
+
+    python -m app.fake_llm --port 8001 --delay 0.05
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8001/v1 uvicorn app.main:app
+
+Answers every request with the same MCQ array, sent in small pieces with a
+delay between them when "stream": true, so time-to-first-question can be
+compared against waiting for the full completion.
+"""
+import json, time, argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED = [
+    {"question": "Price elasticity of demand measures the responsiveness of…",
+     "options": ["Quantity demanded to price", "Price to income", "Supply to cost", "Demand to taste"],
+     "answer": "Quantity demanded to price"},
+    {"question": "Demand is called elastic when |PED| is…",
+     "options": ["Greater than 1", "Less than 1", "Exactly 0", "Exactly 1"],
+     "answer": "Greater than 1"},
+    {"question": "Which good usually has inelastic demand?",
+     "options": ["Salt", "Luxury cars", "Holidays abroad", "Designer clothes"],
+     "answer": "Salt"},
+    {"question": "If price rises and total revenue falls, demand is…",
+     "options": ["Elastic", "Inelastic", "Unit elastic", "Perfectly inelastic"],
+     "answer": "Elastic"},
+]
+
+def _pieces(text: str, size: int = 12):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class Handler(BaseHTTPRequestHandler):
+    delay = 0.05
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        content = "```json\n" + json.dumps(CANNED, ensure_ascii=False, indent=2) + "\n```"
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            data = json.dumps({**base, "object": "chat.completion", "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for piece in _pieces(content):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{
+                "index": 0, "finish_reason": None, "delta": {"content": piece}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def serve(port: int = 8001, delay: float = 0.05) -> ThreadingHTTPServer:
+    Handler.delay = delay
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(prog="python -m app.fake_llm")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--delay", type=float, default=0.05, help="seconds between streamed pieces")
+    args = ap.parse_args()
+    print(f"fake completions on http://127.0.0.1:{args.port}/v1")
+    serve(args.port, args.delay).serve_forever()
@@ -1,5 +1,5 @@
 import os, json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 try:
     from openai import OpenAI
@@ -46,9 +46,9 @@ def refine_plan(topics: List[str], minutes: int) -> List[Dict]:
     """
     return _chat_json(prompt)
 
-def mcqs_from_notes(topic: str, fragments: List[str], n: int = 4) -> List[Dict]:
+def _mcq_prompt(topic: str, fragments: List[str], n: int) -> str:
     joined = "\n\n".join(fragments[:6])
-    prompt = f"""
+    return f"""
     Topic: {topic}
     Notes:
     {joined}
@@ -56,7 +56,69 @@ def mcqs_from_notes(topic: str, fragments: List[str], n: int = 4) -> List[Dict]:
     Make {n} high-quality MCQs. Options A–D. One correct answer.
     Output JSON: [{{"question": "...", "options": ["A","B","C","D"], "answer": "..."}}]
     """
-    return _chat_json(prompt)
+
+def mcqs_from_notes(topic: str, fragments: List[str], n: int = 4) -> List[Dict]:
+    return _chat_json(_mcq_prompt(topic, fragments, n))
+
+class JSONObjectStream:
+    """
+    Incremental parser for a streamed JSON array of objects.
+    feed() text as it arrives; it returns every top-level object that has
+    just been closed. Code fences and prose around the array are skipped.
+    """
+    def __init__(self):
+        self.buf = []
+        self.depth = 0
+        self.in_str = False
+        self.esc = False
+
+    def feed(self, text: str) -> List[Any]:
+        out = []
+        for ch in text:
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+                    self.buf = [ch]
+                continue
+            self.buf.append(ch)
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif ch == "\\":
+                    self.esc = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        out.append(json.loads("".join(self.buf)))
+                    except Exception:
+                        pass  # malformed item: drop it, keep streaming
+        return out
+
+def stream_mcqs_from_notes(topic: str, fragments: List[str], n: int = 4, model: str = "gpt-4o-mini") -> Iterator[Dict]:
+    """Like mcqs_from_notes, but yields each MCQ as soon as its object closes."""
+    cli = _client()
+    if cli is None:
+        return
+    stream = cli.chat.completions.create(
+        model=model,
+        messages=[SYSTEM_JSON, {"role":"user","content":_mcq_prompt(topic, fragments, n)}],
+        temperature=0.2,
+        stream=True,
+    )
+    parser = JSONObjectStream()
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        for obj in parser.feed(delta):
+            yield obj
 
 def missed_topics(syllabus: List[str], covered: List[str]) -> List[Dict]:
     prompt = f"""
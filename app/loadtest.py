@@ -0,0 +1,204 @@
+"""
+Load generator for the FastAPI routes.
+
+    python -m app.loadtest --scenario mixed --concurrency 32 --requests 2000
+    python -m app.loadtest --url http://127.0.0.1:8000 --scenario viewers
+    python -m app.loadtest --trace traces.jsonl --speed 4
+
+Without --url the app is driven in-process through httpx's ASGI transport, so
+numbers reflect the app alone (no sockets, one process). With --url it hits a
+running uvicorn, which is what to use when sizing --workers.
+
+In-process, latency is taken when the app starts its response (status and
+headers sent), not when the ASGI call returns: Starlette runs BackgroundTasks
+inside that call, after the client already has its response, so the
+/start redirect would otherwise be charged for the background refinement.
+
+Scenarios:
+  viewers  a class refreshing the projector view (GET /session/{sid})
+  toggles  bursts of mark-covered and pin/unpin on one session
+  uploads  concurrent POST /start with the sample notes
+  mixed    mostly viewers, some toggles/pins, the odd upload
+
+A trace is JSONL, one request per line:
+  {"t": 0.25, "method": "POST", "path": "/session/{sid}/pin", "form": {"text": "..."}}
+"t" is seconds from the start (optional; omitted = as fast as possible),
+"{sid}" is replaced by the scratch session, "form"/"json" are optional bodies.
+
+A scratch session is created from sample_notes/ before the run and deleted after.
+"""
+import os, re, json, html, time, random, asyncio, argparse, uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from starlette.routing import Match
+
+from .main import app
+
+SAMPLE_DIR = os.path.join(os.getcwd(), "sample_notes")
+
+def route_of(method: str, path: str) -> str:
+    """Group requests by route template, e.g. 'POST /session/{sid}/pin'."""
+    scope = {"type": "http", "method": method, "path": path.split("?", 1)[0]}
+    for r in app.routes:
+        m, _ = r.matches(scope)
+        if m == Match.FULL:
+            return f"{method} {r.path}"
+    return f"{method} {path}"
+
+class Stats:
+    def __init__(self):
+        self.lat: Dict[str, List[float]] = defaultdict(list)
+        self.err: Dict[str, int] = defaultdict(int)
+
+    def add(self, route: str, ms: float, ok: bool):
+        self.lat[route].append(ms)
+        if not ok:
+            self.err[route] += 1
+
+    def report(self, wall: float):
+        def pct(xs, p):
+            return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+        print(f"\n{'route':<44} {'n':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+        total = 0
+        for route in sorted(self.lat):
+            xs = sorted(self.lat[route])
+            total += len(xs)
+            print(f"{route:<44} {len(xs):>6} {len(xs) / wall:>8.1f} {pct(xs, 50):>8.1f} {pct(xs, 95):>8.1f} "
+                  f"{pct(xs, 99):>8.1f} {100 * self.err[route] / len(xs):>6.1f}")
+        errs = sum(self.err.values())
+        print(f"\n{total} requests in {wall:.2f}s = {total / wall:.1f} req/s, {errs} errors (latency in ms)")
+
+SENT_HEADER = "x-loadtest-sent"
+
+def stamp_response_start(asgi_app):
+    """Wrap the app so each response carries the perf_counter() of its http.response.start."""
+    async def wrapped(scope, receive, send):
+        async def stamped(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((SENT_HEADER.encode(), repr(time.perf_counter()).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+        await asgi_app(scope, receive, stamped)
+    return wrapped
+
+async def _send(client: httpx.AsyncClient, stats: Stats, method: str, path: str, **kw) -> Optional[httpx.Response]:
+    t0 = time.perf_counter()
+    r = None
+    try:
+        r = await client.request(method, path, **kw)
+        ok = r.status_code < 400
+    except Exception:
+        ok = False
+    t1 = time.perf_counter()
+    if r is not None and SENT_HEADER in r.headers:
+        t1 = float(r.headers[SENT_HEADER])  # in-process: same clock, see module docstring
+    stats.add(route_of(method, path), (t1 - t0) * 1000, ok)
+    return r
+
+def _created(r: Optional[httpx.Response]) -> Optional[str]:
+    """Session id from a successful POST /start redirect."""
+    loc = r.headers.get("location", "") if r is not None and r.status_code == 303 else ""
+    return loc.rsplit("/", 1)[-1] if loc.startswith("/session/") else None
+
+def _note_files():
+    out = []
+    for fn in sorted(os.listdir(SAMPLE_DIR)):
+        with open(os.path.join(SAMPLE_DIR, fn), "rb") as f:
+            out.append(("notes", (fn, f.read(), "text/markdown")))
+    return out
+
+async def _start(client: httpx.AsyncClient, name: str, notes) -> Optional[str]:
+    return _created(await client.post("/start", data={"session_name": name, "minutes": "30"}, files=notes))
+
+def _scenario(name: str, sid: str, blocks: List[str], frags: List[str], notes):
+    """Return a zero-arg factory producing the next (method, path, kwargs)."""
+    view = lambda: ("GET", f"/session/{sid}", {})
+    toggle = lambda: ("POST", f"/session/{sid}/toggle-covered/{random.choice(blocks)}", {})
+    pin = lambda: ("POST", f"/session/{sid}/pin", {"data": {"text": random.choice(frags)}})
+    upload = lambda: ("POST", "/start", {"data": {"session_name": f"loadtest-{uuid.uuid4().hex[:8]}", "minutes": "30"},
+                                         "files": notes})
+    mix = {
+        "viewers": [(view, 1)],
+        "toggles": [(toggle, 2), (pin, 1)],
+        "uploads": [(upload, 1)],
+        "mixed":   [(view, 90), (toggle, 5), (pin, 4), (upload, 1)],
+    }[name]
+    fns, weights = zip(*mix)
+    return lambda: random.choices(fns, weights)[0]()
+
+async def run_scenario(client, stats: Stats, name: str, sid: str, concurrency: int, total: int, created: List[str]):
+    page = (await client.get(f"/session/{sid}")).text
+    blocks = sorted(set(re.findall(r'toggle-covered/(b\d+)"', page))) or ["b1"]
+    frags = [html.unescape(t) for t in re.findall(r'name="text" value="([^"]*)"', page)] or ["load test pin"]
+    nxt = _scenario(name, sid, blocks, frags, _note_files())
+    left = total
+
+    async def worker():
+        nonlocal left
+        while left > 0:
+            left -= 1
+            method, path, kw = nxt()
+            r = await _send(client, stats, method, path, **kw)
+            if path == "/start" and _created(r):
+                created.append(_created(r))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+async def replay(client, stats: Stats, trace: str, sid: str, speed: float, concurrency: int, created: List[str]):
+    with open(trace, "r", encoding="utf-8") as f:
+        items = [json.loads(ln) for ln in f if ln.strip()]
+    items = [it for it in items if "path" in it]  # tolerate mixed logs
+    sem = asyncio.Semaphore(concurrency)
+    t0 = time.perf_counter()
+
+    async def one(it):
+        if "t" in it:
+            await asyncio.sleep(max(0.0, it["t"] / speed - (time.perf_counter() - t0)))
+        kw = {}
+        if "form" in it: kw["data"] = it["form"]
+        if "json" in it: kw["json"] = it["json"]
+        async with sem:
+            r = await _send(client, stats, it.get("method", "GET").upper(), it["path"].replace("{sid}", sid), **kw)
+        if it["path"] == "/start" and _created(r):
+            created.append(_created(r))
+
+    await asyncio.gather(*[one(it) for it in items])
+
+async def main_async(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stamp_response_start(app)), base_url="http://loadtest", timeout=60)
+    stats = Stats()
+    async with client:
+        sid = await _start(client, f"loadtest-{uuid.uuid4().hex[:8]}", _note_files())
+        if not sid:
+            raise SystemExit("could not create the scratch session via POST /start")
+        created = [sid]
+        t0 = time.perf_counter()
+        try:
+            if args.trace:
+                await replay(client, stats, args.trace, sid, args.speed, args.concurrency, created)
+            else:
+                await run_scenario(client, stats, args.scenario, sid, args.concurrency, args.requests, created)
+        finally:
+            wall = time.perf_counter() - t0
+            for s in created:
+                await client.post(f"/session/{s}/delete")
+    stats.report(wall)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m app.loadtest", description="Drive the app with synthetic or recorded traffic.")
+    ap.add_argument("--url", help="hit a running server instead of the in-process ASGI app")
+    ap.add_argument("--scenario", default="mixed", choices=["viewers", "toggles", "uploads", "mixed"])
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--trace", help="JSONL trace to replay instead of a scenario")
+    ap.add_argument("--speed", type=float, default=1.0, help="trace time multiplier (2 = twice as fast)")
+    asyncio.run(main_async(ap.parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
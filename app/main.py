@@ -1,21 +1,38 @@
-import os, io, json
-import re
-from fastapi import FastAPI, Request, UploadFile, Form, File, Body, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
+import os, json
+import re, time, logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, UploadFile, Form, File, Body, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, JSONResponse, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from datetime import datetime, date
 from .parsers import read_docs
-from . import llm
 
 from .parsers import read_docs  
-from .planner import chunk_fragments, extract_topics, plan_blocks, map_fragments_to_topic
-from .qa import parse_bank, make_mcqs_from_fragments
-from .models import Fragment, PlanBlock, Session, MCQ, Exam
-from .storage import save_session, load_session, new_session_id, load_exams, save_exams, new_exam_id
-
-app = FastAPI()
+from .planner import map_fragments_to_topic, build_fragment_index, FragmentIndex
+from .qa import parse_bank, make_mcqs_from_fragments, stream_mcqs_from_fragments
+from .pipeline import first_pass, read_syllabus, note_fragments, map_fragments, apply_exam_focus, mcq_pools
+from .models import Fragment, Session, MCQ
+from .storage import save_session, load_session, update_session, new_session_id, load_exams, save_exams, new_exam_id
+from .storage import list_sessions, name_taken, migrate_flat_layout, delete_session as storage_delete_session
+from .storage import save_fragments, load_fragments, fragments_version
+from . import coverage, profiling
+from .cache import LRUCache
+
+log = logging.getLogger("blanqo")
+
+@asynccontextmanager
+async def lifespan(app):
+    # sessions saved before the sharded layout are invisible to listing and the
+    # unique-name check until migrated; it only touches the flat top-level files
+    migrate_flat_layout()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+if profiling.enabled():
+    app.add_middleware(profiling.ProfileMiddleware)
 BASE = os.getcwd()
 UPLOADS = os.path.join(BASE, "uploads")
 os.makedirs(UPLOADS, exist_ok=True)
@@ -49,32 +66,28 @@ async def _read_and_save(file: UploadFile, subdir=""):
         f.write(content)
     return path
 
+@app.get("/profiles")
+def profiles(req: Request):
+    if not profiling.authorized(req.headers):
+        raise HTTPException(404)
+    return JSONResponse(profiling.list_profiles())
+
+@app.get("/profiles/{fname}")
+def profile_file(req: Request, fname: str):
+    path = os.path.join(profiling.PROFILE_DIR, os.path.basename(fname))
+    if not profiling.authorized(req.headers) or not fname.endswith((".prof", ".folded", ".json")) or not os.path.isfile(path):
+        raise HTTPException(404)
+    return FileResponse(path, filename=os.path.basename(fname))
+
 def slugify(s: str) -> str:
     s = re.sub(r"[^\w\s-]", "", s).strip().lower()
     s = re.sub(r"[\s_-]+", "-", s)
     return s or "session"
 
-def list_session_files():
-    sess_dir = os.path.join(UPLOADS, "sessions")
-    if not os.path.isdir(sess_dir):
-        return []
-    return [os.path.join(sess_dir, f) for f in os.listdir(sess_dir) if f.endswith(".json")]
-
 @app.get("/", response_class=HTMLResponse)
-def home(req: Request):
-    # sessions
-    recent = []
-    for path in sorted(list_session_files(), reverse=True)[:20]:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            try:
-                data = json.load(f)
-                recent.append({
-                    "id": data["id"],
-                    "name": data.get("name", data["id"]),
-                    "created_at": data.get("created_at", "")
-                })
-            except Exception:
-                pass
+def home(req: Request, cursor: str | None = None):
+    # sessions: newest first, one page at a time
+    recent, next_cursor = list_sessions(limit=20, cursor=cursor)
 
     # exams
     exams = load_exams()
@@ -91,12 +104,15 @@ def home(req: Request):
     return templates.TemplateResponse("home.html", {
         "request": req,
         "recent": recent,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
         "upcoming_exams": upcoming
     })
 
 @app.post("/start")
 async def start(
     req: Request,
+    background: BackgroundTasks,
     session_name: str = Form(...),                      # <-- NEW
     minutes: int = Form(30),                            # <-- moved here
     notes: List[UploadFile] = File(...),
@@ -108,14 +124,7 @@ async def start(
     if not name_clean:
         raise HTTPException(400, "Session name is required.")
 
-    existing_names = set()
-    for path in list_session_files():
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                existing_names.add((json.load(f).get("name","") or "").lower())
-        except Exception:
-            pass
-    if name_clean.lower() in existing_names:
+    if name_taken(name_clean):
         raise HTTPException(400, "Session name must be unique. Pick a different name.")
 
     # persist uploads, build plan (unchanged except we set Session.name below)
@@ -127,26 +136,16 @@ async def start(
     all_texts = [t for _, t in docs]
     if not any((t or "").strip() for t in all_texts):
         return PlainTextResponse("Uploaded notes appear empty or unreadable. Please upload valid .md files.", status_code=400)
-    
-    topics = extract_topics(all_texts, cap=8) or ["Session Overview"]
-
-
-    frags = []
-    for name, text in docs:
-        for ch in chunk_fragments(name, text):
-            frags.append(Fragment(doc_id=name, text=ch))
 
-    topics = extract_topics(all_texts, cap=8) or ["Session Overview"]
-    if not frags and all_texts:
-        frags = [Fragment(doc_id="notes", text=all_texts[0])]
-    blocks_raw = plan_blocks(topics, total_minutes=minutes)
+    # first pass: headings + plan only, so the projector shows something right away;
+    # fragments, exam focus and MCQ pools are filled in by _refine_session
+    blocks = first_pass(docs, minutes)
 
     # syllabus (unchanged)
     syllabus_topics = []
     if syllabus and syllabus.filename:
         spath = await _read_and_save(syllabus, "syllabus")
-        with open(spath, "r", encoding="utf-8", errors="ignore") as f:
-            syllabus_topics = [ln.strip("-* \n\r\t") for ln in f if ln.strip()]
+        syllabus_topics = read_syllabus(spath)
 
     # question bank (unchanged)
     bank = {}
@@ -155,64 +154,223 @@ async def start(
         with open(qpath, "r", encoding="utf-8", errors="ignore") as f:
             bank = parse_bank(f.read())
 
-    # map fragments per block
-    blocks = []
-    frag_texts = [f.text for f in frags]
-    for b in blocks_raw:
-        top_frags = map_fragments_to_topic(frag_texts, b["title"])[:6] if frag_texts else []
-        blocks.append(PlanBlock(id=b["id"], title=b["title"], minutes=b["minutes"],
-                                fragments=[Fragment(doc_id="notes", text=t) for t in top_frags]))
-
     session = Session(
         id=new_session_id(),
         name=name_clean,
         created_at=datetime.now().strftime("%Y-%m-%d %H:%M"),
         blocks=blocks,
         syllabus_topics=syllabus_topics,
-        pins=[])
+        pins=[],
+        status="refining",
+        refine_pid=os.getpid(),
+        refine_started=time.time())
     save_session(session)
+    background.add_task(_refine_session, session.id, docs, bank, [b.id for b in blocks])
 
     resp = RedirectResponse(url=f"/session/{session.id}", status_code=303)
     resp.set_cookie("bank", json.dumps(bank))
     return resp
 
+def _refine_session(sid: str, docs, bank: dict, planned_order: List[str]):
+    """
+    Second pass after /start has redirected. Each stage is computed outside the
+    lock and merged into whatever is on disk by block id, so covered/asked
+    state, pins and duration changes made meanwhile are kept. Always ends with
+    the session "ready" or, if a stage raised, "failed" with what got merged.
+    """
+    status = "failed"
+    try:
+        if _refine_stages(sid, docs, bank, planned_order):
+            status = "ready"
+    except Exception:
+        log.exception("refining session %s failed", sid)
+    finally:
+        def finish(s: Session):
+            s.status = status
+            s.refine_pid = 0
+        _merge(sid, finish)
+
+def _refine_stages(sid: str, docs, bank: dict, planned_order: List[str]) -> bool:
+    """False if the session was deleted part way."""
+    try:
+        sess = load_session(sid)
+    except FileNotFoundError:
+        return False  # deleted before we got here
+
+    # the stages are app.pipeline's; each result is merged by block id
+    # 1) dedupe + fragment mapping
+    frag_texts = note_fragments(docs)
+    mapped = map_fragments(sess.blocks, frag_texts)
+    save_fragments(sid, frag_texts)
+
+    def merge_fragments(s: Session):
+        for b in s.blocks:
+            if b.id in mapped:
+                b.fragments = mapped[b.id]
+    if not _merge(sid, merge_fragments):
+        return False
+
+    # 2) exam focus
+    exams = load_exams()
+    if not _merge(sid, lambda s: apply_exam_focus(s, exams, planned_order)):
+        return False
+
+    # 3) MCQ pools
+    pools = mcq_pools(sess.blocks, mapped, bank)
+
+    def merge_pools(s: Session):
+        for b in s.blocks:
+            if b.id in pools:
+                b.mcq_pool = pools[b.id]
+    return _merge(sid, merge_pools)
+
+def _take_pool(sid: str, bid: str) -> List[dict]:
+    """The block's pre-generated MCQs, removed so the next Generate makes fresh ones."""
+    taken = []
+    def take(s: Session):
+        blk = next((b for b in s.blocks if b.id == bid), None)
+        if blk is not None:
+            taken.extend(q.dict() for q in blk.mcq_pool)
+            blk.mcq_pool = []
+    update_session(sid, take)
+    return taken
+
+def _merge(sid: str, fn) -> bool:
+    try:
+        update_session(sid, fn)
+        coverage.forget(sid)  # fragments/order changed
+        return True
+    except FileNotFoundError:
+        return False
+
+REFINE_TIMEOUT = 600  # seconds; no refinement takes anywhere near this
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+def _load_checked(sid: str) -> Session:
+    """load_session, but a session left "refining" by a dead or stuck process is marked failed."""
+    sess = load_session(sid)
+    if sess.status == "refining" and (not _pid_alive(sess.refine_pid)
+                                      or time.time() - sess.refine_started > REFINE_TIMEOUT):
+        def fail(s: Session):
+            if s.status == "refining":
+                s.status = "failed"
+                s.refine_pid = 0
+        log.warning("session %s was left refining; marking it failed", sid)
+        sess = update_session(sid, fail)
+    return sess
+
+@app.get("/session/{sid}/status")
+def session_status(sid: str):
+    return JSONResponse({"status": _load_checked(sid).status})
+
 @app.post("/session/{sid}/delete")
 def delete_session(sid: str):
-    path = os.path.join(UPLOADS, "sessions", f"{sid}.json")
-    if os.path.isfile(path):
-        os.remove(path)
+    storage_delete_session(sid)
+    coverage.forget(sid)
+    _SEARCH.pop(sid)
     # back to home
     return RedirectResponse(url="/", status_code=303)
 
+PREFETCH_BLOCKS = 2  # blocks after the current one rendered up front
+
 @app.get("/session/{sid}", response_class=HTMLResponse)
 def session_view(req: Request, sid: str):
-    sess = load_session(sid)
+    sess = _load_checked(sid)
     total_minutes = sum(b.minutes for b in sess.blocks) or 0
+    syllabus_status = coverage.syllabus_status(sess) if sess.syllabus_topics else []
+    # render the current block (first not covered) and its neighbours; the rest load on demand
+    current = next((i for i, b in enumerate(sess.blocks) if not b.covered), 0)
+    window = sess.blocks[max(0, current - 1): current + PREFETCH_BLOCKS + 1]
     return templates.TemplateResponse("session.html", {
         "request": req, "sid": sid, "sess": sess,
-        "total_minutes": total_minutes
+        "total_minutes": total_minutes,
+        "syllabus_status": syllabus_status,
+        "current": current,
+        "loaded_ids": {b.id for b in window}
+    })
+
+@app.get("/session/{sid}/block/{bid}")
+def block_detail(sid: str, bid: str):
+    sess = load_session(sid)
+    blk = next((b for b in sess.blocks if b.id == bid), None)
+    if blk is None:
+        raise HTTPException(404, "No such block.")
+    return JSONResponse({
+        "id": blk.id, "title": blk.title, "minutes": blk.minutes, "covered": blk.covered,
+        "fragments": [f.text for f in blk.fragments],
+        "asked_mcqs": [q.dict() for q in blk.asked_mcqs],
     })
 
 @app.post("/session/{sid}/toggle-covered/{bid}")
 def toggle_covered(sid: str, bid: str):
+    def toggle(sess):
+        for b in sess.blocks:
+            if b.id == bid:
+                b.covered = not b.covered
+                break
+    update_session(sid, toggle)
+    return RedirectResponse(url=f"/session/{sid}", status_code=303)
+
+@app.get("/session/{sid}/missed")
+def missed(sid: str, k: int = 3, use_llm: bool = False):
     sess = load_session(sid)
-    for b in sess.blocks:
-        if b.id == bid:
-            b.covered = not b.covered
-            break
-    save_session(sess)
+    return JSONResponse(coverage.missed_topics(sess, k=k, use_llm=use_llm))
+
+_SEARCH = LRUCache(maxsize=64)  # sid -> (fragments file version, texts, index); these hold every fragment
+
+def _search_index(sid: str):
+    """All of the session's fragments, indexed once per version of the fragments file."""
+    version = fragments_version(sid)
+    hit = _SEARCH.get(sid)
+    if hit is not None and version is not None and hit[0] == version:
+        return hit[1], hit[2]
+    texts = load_fragments(sid) if version is not None else None
+    if texts is None:
+        # not refined yet (or an older session): only what the blocks hold, not cached
+        sess = load_session(sid)
+        texts = list(dict.fromkeys(f.text for b in sess.blocks for f in b.fragments))
+        return texts, FragmentIndex(texts)
+    texts = list(dict.fromkeys(texts))
+    index = build_fragment_index(texts)
+    _SEARCH.put(sid, (version, texts, index))
+    return texts, index
+
+@app.get("/session/{sid}/search")
+def search_fragments(sid: str, q: str, k: int = 6):
+    if not q.strip():
+        return JSONResponse([])
+    texts, index = _search_index(sid)
+    return JSONResponse(map_fragments_to_topic(texts, q, top_k=k, index=index))
+
+@app.post("/session/{sid}/order-by-syllabus")
+def order_blocks_by_syllabus(sid: str):
+    def reorder(sess):
+        order = coverage.block_order(sess)
+        by_id = {b.id: b for b in sess.blocks}
+        sess.blocks = [by_id[bid] for bid in order]
+    update_session(sid, reorder)
     return RedirectResponse(url=f"/session/{sid}", status_code=303)
 
 @app.post("/session/{sid}/pin")
 async def pin_fragment(sid: str, text: str = Form(...)):
-    sess = load_session(sid)
-    i = next((i for i,p in enumerate(sess.pins) if p.text == text), None)
-    if i is not None:
-        sess.pins.pop(i)  # unpin
-    else:
-        if not any(p.text == text for p in sess.pins):
-            sess.pins = ([Fragment(doc_id="notes", text=text)] + sess.pins)[:3]
-    save_session(sess)
+    def pin(sess):
+        i = next((i for i,p in enumerate(sess.pins) if p.text == text), None)
+        if i is not None:
+            sess.pins.pop(i)  # unpin
+        else:
+            if not any(p.text == text for p in sess.pins):
+                sess.pins = ([Fragment(doc_id="notes", text=text)] + sess.pins)[:3]
+    await run_in_threadpool(update_session, sid, pin)  # may wait on the session lock
     return RedirectResponse(url=f"/session/{sid}", status_code=303)
 
 
@@ -224,31 +382,63 @@ async def generate_mcq(req: Request, sid: str, bid: str):
         bank = json.loads(req.cookies.get("bank","{}"))
     except: pass
     blk = next(b for b in sess.blocks if b.id == bid)
-    mcqs = make_mcqs_from_fragments(blk.title, [f.text for f in blk.fragments], bank)
+    mcqs = await run_in_threadpool(_take_pool, sid, bid) if blk.mcq_pool else []
+    if not mcqs:
+        mcqs = await run_in_threadpool(make_mcqs_from_fragments, blk.title, [f.text for f in blk.fragments], bank)
     return PlainTextResponse(json.dumps(mcqs, ensure_ascii=False, indent=2), media_type="application/json")
 
-@app.post("/session/{sid}/mcq_asked/{bid}")
-async def mcq_asked(sid: str, bid: str, payload: dict = Body(...)):
+@app.post("/session/{sid}/mcq/{bid}/stream")
+async def generate_mcq_stream(req: Request, sid: str, bid: str):
+    """NDJSON: one MCQ per line as soon as it is ready, then a {"done": true} timing line."""
     sess = load_session(sid)
+    bank = {}
+    try:
+        bank = json.loads(req.cookies.get("bank","{}"))
+    except: pass
     blk = next(b for b in sess.blocks if b.id == bid)
+    frags = [f.text for f in blk.fragments]
+
+    def lines():
+        t0 = time.perf_counter()
+        ttfq = None
+        count = 0
+        pooled = _take_pool(sid, bid) if blk.mcq_pool else []
+        source = pooled or stream_mcqs_from_fragments(blk.title, frags, bank)
+        for q in source:
+            if ttfq is None:
+                ttfq = (time.perf_counter() - t0) * 1000
+            count += 1
+            yield json.dumps(q, ensure_ascii=False) + "\n"
+        total = (time.perf_counter() - t0) * 1000
+        log.info("mcq stream sid=%s bid=%s n=%d ttfq_ms=%.1f total_ms=%.1f", sid, bid, count, ttfq or total, total)
+        yield json.dumps({"done": True, "ttfq_ms": round(ttfq or total, 1), "total_ms": round(total, 1)}) + "\n"
+
+    # sync generator: starlette iterates it in a threadpool, so the blocking LLM stream is fine
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/session/{sid}/mcq_asked/{bid}")
+async def mcq_asked(sid: str, bid: str, payload: dict = Body(...)):
     q = payload.get("question","")
-    if q and not any(m.question == q for m in blk.asked_mcqs):
-        blk.asked_mcqs.append(MCQ(
-            question=q,
-            options=payload.get("options",[])[:6],
-            answer=payload.get("answer","")
-        ))
-        save_session(sess)
+    def asked(sess):
+        blk = next(b for b in sess.blocks if b.id == bid)
+        if q and not any(m.question == q for m in blk.asked_mcqs):
+            blk.asked_mcqs.append(MCQ(
+                question=q,
+                options=payload.get("options",[])[:6],
+                answer=payload.get("answer","")
+            ))
+    await run_in_threadpool(update_session, sid, asked)
     return PlainTextResponse("OK")
 
 @app.post("/session/{sid}/duration")
 async def update_duration(sid: str, minutes: int = Form(...)):
-    sess = load_session(sid)
-    old_sum = sum(b.minutes for b in sess.blocks) or 1
-    scale = max(10, minutes) / old_sum
-    for b in sess.blocks:
-        b.minutes = max(3, int(round(b.minutes * scale)))
-    save_session(sess)
+    def rescale(sess):
+        old_sum = sum(b.minutes for b in sess.blocks) or 1
+        scale = max(10, minutes) / old_sum
+        for b in sess.blocks:
+            b.minutes = max(3, int(round(b.minutes * scale)))
+    await run_in_threadpool(update_session, sid, rescale)
     return RedirectResponse(url=f"/session/{sid}", status_code=303)
 
 @app.post("/exams/add")
@@ -269,70 +459,8 @@ def delete_exam(eid: str):
 
 def order_by_syllabus(topics: List[str], syllabus_topics: List[str]) -> List[str]:
     """Return topics ordered by syllabus first (in given order), then leftovers."""
-    if not syllabus_topics:
-        return topics
-    lower_map = {t.lower(): t for t in topics}
-    ordered = []
-    seen = set()
-    # syllabus order (case-insensitive matches to extracted topics)
-    for s in syllabus_topics:
-        k = s.strip().lower()
-        if k in lower_map and k not in seen:
-            ordered.append(lower_map[k])
-            seen.add(k)
-    # leftovers
-    for t in topics:
-        if t not in seen:
-            ordered.append(t)
-    return ordered
-
-def boost_nearest_exam_topics(topics: List[str], exams: List[dict]) -> List[str]:
-    """Bring nearest exam topics to the front (keeping syllabus ordering within that subset)."""
-    if not exams:
-        return topics
-    # choose nearest upcoming exam
-    today = date.today()
-    def _parse(d):
-        try: return datetime.strptime(d, "%Y-%m-%d").date()
-        except: return None
-    future = [(e, _parse(e.get("date",""))) for e in exams]
-    future = [x for x in future if x[1] and x[1] >= today]
-    if not future:
-        return topics
-    nearest = sorted(future, key=lambda x: x[1])[0][0]
-    focus = [t.strip().lower() for t in nearest.get("topics", []) if t.strip()]
-    if not focus:
-        return topics
-
-    in_focus = []
-    others = []
-    for t in topics:
-        (in_focus if t.lower() in focus else others).append(t)
-    return in_focus + others
-
-def allocate_minutes_with_focus(blocks_raw: List[dict], focus_topics: List[str], total_minutes: int) -> List[dict]:
-    """Give +40% budget to focus topics, normalize total to requested minutes."""
-    if not blocks_raw:
-        return blocks_raw
-    base = 1.0
-    boost = 1.4
-    weights = []
-    for b in blocks_raw:
-        w = boost if b["title"].lower() in [ft.lower() for ft in focus_topics] else base
-        weights.append(w)
-    s = sum(weights) or 1.0
-    per_unit = total_minutes / s
-    out = []
-    for i, b in enumerate(blocks_raw):
-        mins = max(3, int(round(weights[i] * per_unit)))
-        out.append({"id": b["id"], "title": b["title"], "minutes": mins})
-    # tiny final normalization to hit the exact total
-    diff = total_minutes - sum(x["minutes"] for x in out)
-    if diff != 0:
-        # adjust the first block (or last) by the diff
-        idx = 0 if diff > 0 else -1
-        out[idx]["minutes"] = max(3, out[idx]["minutes"] + diff)
-    return out
+    # similarity match, so "Price Elasticity" lines up with "Elasticity of demand"
+    return coverage.order_topics(topics, syllabus_topics)
 
 @app.get("/session/{sid}/export")
 def export_session(sid: str):
@@ -0,0 +1,12 @@
+"""
+Move sessions from the old flat uploads/sessions/<id>.json layout into the
+sharded one (see storage.py). The app also does this on startup; this is for
+migrating a copied-in data directory without starting the server. Safe to
+re-run; already migrated sessions are left alone.
+
+    python -m app.migrate
+"""
+from .storage import migrate_flat_layout
+
+if __name__ == "__main__":
+    print(f"migrated {migrate_flat_layout()} session(s)")
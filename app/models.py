@@ -25,6 +25,7 @@ class PlanBlock(BaseModel):
     fragments: List[Fragment] = []
     covered: bool = False
     asked_mcqs: List[MCQ]=[]
+    mcq_pool: List[MCQ] = []   # pre-generated while the session refines
 
 class Session(BaseModel):
     id: str
@@ -33,3 +34,6 @@ class Session(BaseModel):
     blocks: List[PlanBlock]
     syllabus_topics: List[str] = []
     pins: List[Fragment] = []
+    status: str = "ready"      # "refining" while the background pass is still filling it in, "failed" if it died
+    refine_pid: int = 0        # process running that pass, so a restart doesn't leave it "refining" forever
+    refine_started: float = 0
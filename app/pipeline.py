@@ -0,0 +1,147 @@
+"""
+Session building, shared by POST /start and the offline batch builder.
+
+/start runs first_pass() in the request and the remaining stages in
+_refine_session, merging each into the saved session; app.batch runs them
+all at once through build_session().
+"""
+import os
+from datetime import datetime, date
+from typing import Dict, List, Tuple
+
+from . import llm
+from .planner import chunk_fragments, extract_topics, plan_blocks, map_fragments_to_topic, build_fragment_index
+from .qa import make_mcqs_from_fragments
+from .models import Fragment, PlanBlock, Session, MCQ
+from .storage import new_session_id
+
+# pre-generating MCQ pools spends LLM calls on blocks that may never be asked about
+POOL_USE_LLM = os.getenv("BLANQO_POOL_LLM", "") == "1"
+
+def read_syllabus(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [ln.strip("-* \n\r\t") for ln in f if ln.strip()]
+
+def first_pass(docs, minutes: int) -> List[PlanBlock]:
+    """Headings + plan only: cheap enough to show before anything else is done."""
+    topics = extract_topics([t for _, t in docs], cap=8) or ["Session Overview"]
+    return [PlanBlock(id=b["id"], title=b["title"], minutes=b["minutes"])
+            for b in plan_blocks(topics, total_minutes=minutes)]
+
+def note_fragments(docs) -> List[str]:
+    """Deduped fragments of every document (the whole first document if nothing chunks)."""
+    texts = [ch for name, text in docs for ch in chunk_fragments(name, text)]
+    if not texts and docs:
+        texts = [docs[0][1]]
+    return texts
+
+def map_fragments(blocks: List[PlanBlock], frag_texts: List[str]) -> Dict[str, List[Fragment]]:
+    """Each block's top fragments, by block id."""
+    index = build_fragment_index(frag_texts) if frag_texts else None  # fitted once for all blocks
+    return {b.id: [Fragment(doc_id="notes", text=t)
+                   for t in (map_fragments_to_topic(frag_texts, b.title, index=index)[:6] if frag_texts else [])]
+            for b in blocks}
+
+def apply_exam_focus(sess: Session, exams: List[dict], planned_order: List[str]):
+    """
+    Nearest exam's topics get more time, and go first unless the teacher has
+    already touched the plan: nothing covered and blocks still in
+    `planned_order` (the first-pass order, e.g. not "Order by syllabus"-ed).
+    """
+    focus = [t for t in (_nearest_exam(exams) or {}).get("topics", []) if t.strip()]
+    if not focus:
+        return
+    untouched = [b.id for b in sess.blocks] == list(planned_order) and not any(b.covered for b in sess.blocks)
+    if untouched:
+        by_title = {b.title: b for b in sess.blocks}
+        sess.blocks = [by_title[t] for t in boost_nearest_exam_topics([b.title for b in sess.blocks], exams)]
+    total = sum(b.minutes for b in sess.blocks)
+    alloc = allocate_minutes_with_focus([{"id": b.id, "title": b.title, "minutes": b.minutes} for b in sess.blocks], focus, total)
+    for b, a in zip(sess.blocks, alloc):
+        b.minutes = a["minutes"]
+
+def mcq_pools(blocks: List[PlanBlock], mapped: Dict[str, List[Fragment]], bank: dict,
+              use_llm: bool = POOL_USE_LLM) -> Dict[str, List[MCQ]]:
+    """
+    First set of MCQs per block, so the first Generate is instant. Empty when
+    an LLM is configured but not allowed here, so Generate asks it live.
+    """
+    if not use_llm and llm.available():
+        return {}
+    return {b.id: [MCQ(**q) for q in make_mcqs_from_fragments(b.title, [f.text for f in mapped.get(b.id, [])],
+                                                              bank, use_llm=use_llm)]
+            for b in blocks}
+
+def build_session(name: str, docs, minutes: int = 30, syllabus_topics: List[str] | None = None,
+                  bank: dict | None = None, exams: List[dict] | None = None) -> Tuple[Session, List[str]]:
+    """Every stage in one go. Returns the session and all of its fragments (for save_fragments)."""
+    sess = Session(
+        id=new_session_id(),
+        name=name,
+        created_at=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        blocks=first_pass(docs, minutes),
+        syllabus_topics=syllabus_topics or [],
+        pins=[])
+    frag_texts = note_fragments(docs)
+    mapped = map_fragments(sess.blocks, frag_texts)
+    for b in sess.blocks:
+        b.fragments = mapped[b.id]
+    apply_exam_focus(sess, exams or [], [b.id for b in sess.blocks])
+    pools = mcq_pools(sess.blocks, mapped, bank or {})
+    for b in sess.blocks:
+        b.mcq_pool = pools.get(b.id, [])
+    return sess, frag_texts
+
+def _nearest_exam(exams: List[dict]):
+    """The next upcoming exam, or None."""
+    today = date.today()
+    def _parse(d):
+        try: return datetime.strptime(d, "%Y-%m-%d").date()
+        except: return None
+    future = [(e, _parse(e.get("date",""))) for e in exams]
+    future = [x for x in future if x[1] and x[1] >= today]
+    if not future:
+        return None
+    return sorted(future, key=lambda x: x[1])[0][0]
+
+def boost_nearest_exam_topics(topics: List[str], exams: List[dict]) -> List[str]:
+    """Bring nearest exam topics to the front (keeping syllabus ordering within that subset)."""
+    if not exams:
+        return topics
+    # choose nearest upcoming exam
+    nearest = _nearest_exam(exams)
+    if nearest is None:
+        return topics
+    focus = [t.strip().lower() for t in nearest.get("topics", []) if t.strip()]
+    if not focus:
+        return topics
+
+    in_focus = []
+    others = []
+    for t in topics:
+        (in_focus if t.lower() in focus else others).append(t)
+    return in_focus + others
+
+def allocate_minutes_with_focus(blocks_raw: List[dict], focus_topics: List[str], total_minutes: int) -> List[dict]:
+    """Give +40% budget to focus topics, normalize total to requested minutes."""
+    if not blocks_raw:
+        return blocks_raw
+    base = 1.0
+    boost = 1.4
+    weights = []
+    for b in blocks_raw:
+        w = boost if b["title"].lower() in [ft.lower() for ft in focus_topics] else base
+        weights.append(w)
+    s = sum(weights) or 1.0
+    per_unit = total_minutes / s
+    out = []
+    for i, b in enumerate(blocks_raw):
+        mins = max(3, int(round(weights[i] * per_unit)))
+        out.append({"id": b["id"], "title": b["title"], "minutes": mins})
+    # tiny final normalization to hit the exact total
+    diff = total_minutes - sum(x["minutes"] for x in out)
+    if diff != 0:
+        # adjust the first block (or last) by the diff
+        idx = 0 if diff > 0 else -1
+        out[idx]["minutes"] = max(3, out[idx]["minutes"] + diff)
+    return out
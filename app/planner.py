@@ -1,4 +1,5 @@
 import os, re
+import numpy as np
 from typing import Iterable, List, Tuple
 from scipy.sparse import vstack
 from markdown_it import MarkdownIt
@@ -197,11 +198,45 @@ def plan_blocks(topics: List[str], total_minutes: int = 30):
             b["minutes"] = max(3, int(round(b["minutes"] * scale)))
     return blocks
 
-def map_fragments_to_topic(fragments: List[str], topic: str, top_k=3):
+class FragmentIndex:
+    """
+    Exact TF-IDF scoring over one session's fragments. Fitted once, then each
+    query is a single sparse product, so mapping every block (or serving every
+    search) doesn't refit the vectorizer.
+    """
+    def __init__(self, fragments: List[str]):
+        self.vec = TfidfVectorizer(stop_words="english")
+        try:
+            self.X = self.vec.fit_transform(fragments)
+        except ValueError:
+            self.X = None  # empty vocabulary (only stop words)
+
+    def search(self, query: str, k: int = 3) -> List[int]:
+        """Row indices of the top-k fragments for query, best first."""
+        if self.X is None or self.X.shape[0] == 0:
+            return []
+        sims = (self.X @ self.vec.transform([query]).T).toarray().ravel()
+        k = min(k, sims.size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        return [int(i) for i in top[np.argsort(-sims[top], kind="stable")]]
+
+# Dense LSA/IVF (app/dense.py) is off unless this is set. Exact sparse scoring
+# wins at the sizes we've measured; only turn it on once `python -m app.dense`
+# on your own (distinct) notes shows better latency at acceptable recall.
+DENSE_MIN_FRAGMENTS = int(os.getenv("BLANQO_DENSE_MIN_FRAGMENTS", "0"))
+
+def build_fragment_index(fragments: List[str], min_fragments: int = DENSE_MIN_FRAGMENTS):
+    """Sparse exact index, or the dense one when enabled and the session is big enough."""
+    if min_fragments and len(fragments) >= min_fragments:
+        from .dense import build_index
+        index = build_index(fragments)
+        if index is not None:
+            return index
+    return FragmentIndex(fragments)
+
+def map_fragments_to_topic(fragments: List[str], topic: str, top_k=3, index=None):
     if not fragments:
         return []
-    vec = TfidfVectorizer(stop_words="english")
-    X = vec.fit_transform(fragments + [topic])
-    sims = (X[:-1] @ X[-1].T).toarray().ravel()
-    idx = sims.argsort()[::-1][:top_k]
-    return [fragments[i] for i in idx]
+    if index is None:
+        index = FragmentIndex(fragments)
+    return [fragments[i] for i in index.search(topic, top_k)]
@@ -0,0 +1,220 @@
+"""
+Opt-in per-request profiling.
+
+Off unless one of these is set when the app starts (nothing is installed
+otherwise, so there is no per-request cost):
+
+    BLANQO_PROFILE_TOKEN=secret   profile requests sent with  X-Blanqo-Profile: secret
+    BLANQO_PROFILE=1              profile every request (local debugging only)
+
+Each captured request leaves three files in uploads/profiles/, named
+<time>_<route>_<session id>:
+    .prof    cProfile stats     (python -m pstats, snakeviz)
+    .folded  sampled stacks     (flamegraph.pl, speedscope)
+    .json    what was captured  (listed by GET /profiles)
+
+A capture follows the request into the threadpool: sync routes, sync
+StreamingResponse generators and sync BackgroundTasks (e.g. _refine_session
+after /start) all go through anyio.to_thread.run_sync, which is wrapped so a
+worker thread is profiled and sampled while it runs a call made for the
+captured request (tracked in a contextvar). Workers serving other requests
+are left out.
+
+The event-loop thread is profiled as a whole for the length of the capture,
+so other async requests handled meanwhile are mixed into its numbers. Only
+one request is captured at a time; requests arriving during a capture are
+not captured themselves.
+"""
+import os, sys, hmac, json, time, pstats, cProfile, threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+PROFILE_DIR = os.path.join(os.getcwd(), "uploads", "profiles")
+HEADER = "x-blanqo-profile"
+TOKEN = os.getenv("BLANQO_PROFILE_TOKEN", "")
+ALWAYS = os.getenv("BLANQO_PROFILE", "") == "1"
+
+def enabled() -> bool:
+    return bool(TOKEN) or ALWAYS
+
+def _token_ok(value: str) -> bool:
+    """Constant-time, so response timing doesn't leak the token."""
+    return bool(TOKEN) and hmac.compare_digest(value.encode("utf-8"), TOKEN.encode("utf-8"))
+
+def authorized(headers) -> bool:
+    """For /profiles: open when profiling everything, else the admin header must match."""
+    return ALWAYS or _token_ok(headers.get(HEADER, ""))
+
+class StackSampler(threading.Thread):
+    """
+    Samples the registered threads' stacks every `interval` seconds into
+    folded-stack counts, each rooted at the thread's label ("loop", "worker").
+    """
+    def __init__(self, interval: float = 0.002):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.threads = {}  # thread id -> label
+        self.stacks = Counter()
+        self._halt = threading.Event()
+
+    def add(self, thread_id: int, label: str):
+        self.threads[thread_id] = label
+
+    def discard(self, thread_id: int):
+        self.threads.pop(thread_id, None)
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, label in list(self.threads.items()):
+                frame = frames.get(tid)
+                names = []
+                while frame is not None:
+                    co = frame.f_code
+                    names.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if names:
+                    self.stacks[";".join([label] + names[::-1])] += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+class Capture:
+    """One request's profilers: the event loop's, plus one per threadpool call made for it."""
+    def __init__(self):
+        self.loop = cProfile.Profile()
+        self.sampler = StackSampler()
+        self.workers = []
+        self.worker_calls = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.sampler.add(threading.get_ident(), "loop")
+        self.sampler.start()
+        self.loop.enable()
+
+    def stop(self):
+        self.loop.disable()
+        self.sampler.stop()
+
+    def run(self, func, *args):
+        """Runs in the worker thread in place of func."""
+        tid = threading.get_ident()
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            prof = None  # 3.12+ allows one profiler per interpreter; still sampled
+        self.sampler.add(tid, "worker")
+        try:
+            return func(*args)
+        finally:
+            self.sampler.discard(tid)
+            if prof is not None:
+                prof.disable()
+            with self._lock:
+                self.worker_calls += 1
+                if prof is not None:
+                    self.workers.append(prof)
+
+    def stats(self) -> pstats.Stats:
+        st = pstats.Stats(self.loop)
+        for prof in self.workers:
+            st.add(prof)
+        return st
+
+_capture: ContextVar = ContextVar("blanqo_profile_capture", default=None)
+
+def _follow_into_threadpool():
+    """Wrap anyio.to_thread.run_sync (what starlette's run_in_threadpool calls), once."""
+    import anyio.to_thread
+    original = anyio.to_thread.run_sync
+    if getattr(original, "_blanqo", False):
+        return
+
+    async def run_sync(func, *args, **kw):
+        cap = _capture.get()
+        if cap is None:
+            return await original(func, *args, **kw)
+        return await original(cap.run, func, *args, **kw)
+    run_sync._blanqo = True
+    anyio.to_thread.run_sync = run_sync
+
+class ProfileMiddleware:
+    """Pure ASGI, so streamed bodies and BackgroundTasks are inside the capture too."""
+    def __init__(self, app):
+        self.app = app
+        self.busy = False
+        _follow_into_threadpool()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.busy or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        location = {}
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                for k, v in message.get("headers", []):
+                    if k == b"location":
+                        location["url"] = v.decode("latin-1")
+            await send(message)
+
+        self.busy = True
+        cap = Capture()
+        token = _capture.set(cap)
+        t0 = time.perf_counter()
+        cap.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            cap.stop()
+            _capture.reset(token)
+            self.busy = False
+            _save(scope, cap, (time.perf_counter() - t0) * 1000, location.get("url", ""))
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith("/profiles"):
+            return False  # don't capture the act of reading captures
+        if ALWAYS:
+            return True
+        for k, v in scope.get("headers", []):
+            if k == HEADER.encode():
+                return _token_ok(v.decode("latin-1"))
+        return False
+
+def _save(scope, cap: Capture, ms: float, location: str):
+    endpoint = scope.get("endpoint")
+    route = getattr(endpoint, "__name__", "") or scope["path"].strip("/").replace("/", "-") or "home"
+    sid = scope.get("path_params", {}).get("sid", "")
+    if not sid and location.startswith("/session/"):
+        sid = location.rsplit("/", 1)[-1]  # /start: the new session is in the redirect
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{route}_{sid or 'none'}"
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    cap.stats().dump_stats(base + ".prof")
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        f.write(cap.sampler.folded())
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"name": name, "route": route, "sid": sid, "method": scope["method"], "path": scope["path"],
+                   "ms": round(ms, 1), "samples": sum(cap.sampler.stacks.values()),
+                   "worker_calls": cap.worker_calls,
+                   "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for fn in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if fn.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, fn), "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except Exception:
+                pass
+    return out
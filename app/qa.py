@@ -1,5 +1,5 @@
 import random, re
-from typing import List, Dict
+from typing import List, Dict, Iterator
 from . import llm
 
 def parse_bank(text: str) -> Dict[str, List[Dict]]:
@@ -29,32 +29,41 @@ def mcqize(q: str, a: str):
         opts[random.randrange(len(opts))] = a
     return {"question": q, "options": opts, "answer": a}
 
-def make_mcqs_from_fragments(topic: str, frags: List[str], bank: Dict[str, List[Dict]], n=4):
+def make_mcqs_from_fragments(topic: str, frags: List[str], bank: Dict[str, List[Dict]], n=4, use_llm=True):
     # 0) Prefer uploaded bank
     made = []
     for it in bank.get(topic, []):
         made.append(mcqize(it["q"], it["a"]))
         if len(made) >= n: return made
 
-    # 1) LLM path (if available)
-    if llm.available():
+    # 1) LLM path (if available and wanted)
+    if use_llm and llm.available():
         try:
             res = llm.mcqs_from_notes(topic, frags, n=n) or []
             valid = []
             for q in res:
-                if isinstance(q, dict) and q.get("question") and q.get("options") and q.get("answer"):
-                    # normalize to exactly 4 options if possible
-                    opts = list(q["options"])[:4] if isinstance(q["options"], list) else []
-                    if len(opts) < 4:
-                        # pad with dummy distractors
-                        while len(opts) < 4:
-                            opts.append(f"Option {len(opts)+1}")
-                    valid.append({"question": q["question"], "options": opts, "answer": q["answer"]})
+                v = _validate_llm_mcq(q)
+                if v:
+                    valid.append(v)
                 if len(valid) >= n: break
             if valid:
                 return valid[:n]
         except Exception:
             pass
+    return _fallback_mcqs(topic, frags, made, n)
+
+def _validate_llm_mcq(q):
+    if isinstance(q, dict) and q.get("question") and q.get("options") and q.get("answer"):
+        # normalize to exactly 4 options if possible
+        opts = list(q["options"])[:4] if isinstance(q["options"], list) else []
+        if len(opts) < 4:
+            # pad with dummy distractors
+            while len(opts) < 4:
+                opts.append(f"Option {len(opts)+1}")
+        return {"question": q["question"], "options": opts, "answer": q["answer"]}
+    return None
+
+def _fallback_mcqs(topic: str, frags: List[str], made: List[Dict], n: int):
     # Fallback from text
     sentences = []
     for f in frags:
@@ -72,3 +81,25 @@ def make_mcqs_from_fragments(topic: str, frags: List[str], bank: Dict[str, List[
         made.append({"question": f"{topic}: True or False — definition examples are helpful.",
                      "options": ["True","False"], "answer": "True"})
     return made
+
+
+def stream_mcqs_from_fragments(topic: str, frags: List[str], bank: Dict[str, List[Dict]], n=4) -> Iterator[Dict]:
+    """Bank, then LLM, then notes — yielded one at a time, topped up to n from the notes."""
+    made = []
+    for it in bank.get(topic, []):
+        made.append(mcqize(it["q"], it["a"]))
+        yield made[-1]
+        if len(made) >= n: return
+
+    if llm.available():
+        try:
+            for q in llm.stream_mcqs_from_notes(topic, frags, n=n - len(made)):
+                v = _validate_llm_mcq(q)
+                if v:
+                    made.append(v)
+                    yield v
+                if len(made) >= n: return
+        except Exception:
+            pass  # mid-stream failure: top up from the notes below
+    for q in _fallback_mcqs(topic, frags, list(made), n)[len(made):]:
+        yield q
@@ -9,13 +9,106 @@ document.addEventListener("DOMContentLoaded", () => {
     range.addEventListener("input", () => { label.textContent = `${range.value}m`; });
   }
 
+  // First-pass plan: poll until the background refinement lands ("ready" or "failed"),
+  // then reload to show it. Gives up after a few minutes rather than polling forever.
+  if (document.body.dataset.status === "refining") {
+    const MAX_POLLS = 120;
+    let polls = 0;
+    const poll = setInterval(() => {
+      if (++polls > MAX_POLLS) {
+        clearInterval(poll);
+        const tag = document.querySelector(".tag.refining");
+        if (tag) tag.textContent = "Still refining; reload the page to check again";
+        return;
+      }
+      fetch(`/session/${sid}/status`).then(r => r.json()).then(js => {
+        if (js.status !== "refining") { clearInterval(poll); location.reload(); }
+      }).catch(() => {});
+    }, 1500);
+  }
+
+  // Lazy blocks: only the current block and its neighbours are rendered by the server,
+  // the rest are fetched from /session/{sid}/block/{bid} ahead of navigation.
+  const blocks = [...document.querySelectorAll(".main-content > section.block")];
+  const PREFETCH = 2;
+  const pending = {};
+
+  function fillBlock(sec, data) {
+    const frags = sec.querySelector(".frags");
+    frags.innerHTML = "";
+    data.fragments.forEach(text => {
+      const art = document.createElement("article");
+      art.className = "frag";
+      const p = document.createElement("p");
+      p.textContent = text;
+      const form = document.createElement("form");
+      form.method = "post";
+      form.action = `/session/${sid}/pin`;
+      const input = document.createElement("input");
+      input.type = "hidden"; input.name = "text"; input.value = text;
+      const btn = document.createElement("button");
+      btn.className = "btn small"; btn.textContent = "Pin";
+      form.append(input, btn);
+      art.append(p, form);
+      frags.appendChild(art);
+    });
+    const host = sec.querySelector(".asked-host");
+    host.innerHTML = "";
+    if (data.asked_mcqs.length) {
+      const det = document.createElement("details");
+      det.className = "asked";
+      const sum = document.createElement("summary");
+      sum.textContent = `Asked already (${data.asked_mcqs.length})`;
+      const ol = document.createElement("ol");
+      data.asked_mcqs.forEach(q => {
+        const li = document.createElement("li");
+        li.textContent = q.question;
+        ol.appendChild(li);
+      });
+      det.append(sum, ol);
+      host.appendChild(det);
+    }
+    sec.dataset.loaded = "true";
+  }
+
+  function load(i) {
+    const sec = blocks[i];
+    if (!sec || sec.dataset.loaded === "true") return Promise.resolve();
+    if (!pending[sec.id]) {
+      pending[sec.id] = fetch(`/session/${sid}/block/${sec.id}`)
+        .then(r => r.json())
+        .then(data => fillBlock(sec, data))
+        .catch(() => { delete pending[sec.id]; });
+    }
+    return pending[sec.id];
+  }
+
+  function prefetch(i) {
+    for (let j = i - 1; j <= i + PREFETCH; j++) load(j);
+  }
+
   // Keyboard navigation
-  const blocks = [...document.querySelectorAll("section.block")];
-  let idx = 0;
+  let idx = Math.max(0, Math.min(blocks.length - 1, parseInt(document.body.dataset.current || "0", 10)));
   const go = (i) => {
+    if (!blocks.length) return;
     idx = Math.max(0, Math.min(blocks.length - 1, i));
+    load(idx);
     blocks[idx].scrollIntoView({ behavior: "smooth", block: "start" });
+    prefetch(idx);
   };
+  prefetch(idx);
+
+  // Next Up links and manual scrolling
+  window.addEventListener("hashchange", () => {
+    const i = blocks.findIndex(b => `#${b.id}` === location.hash);
+    if (i >= 0) go(i);
+  });
+  if ("IntersectionObserver" in window) {
+    const io = new IntersectionObserver(entries => {
+      entries.forEach(e => { if (e.isIntersecting) load(blocks.indexOf(e.target)); });
+    }, { rootMargin: "100% 0px" });
+    blocks.forEach(b => io.observe(b));
+  }
   document.addEventListener("keydown", (e) => {
     if (e.key === "ArrowRight") { go(idx + 1); }
     if (e.key === "ArrowLeft")  { go(idx - 1); }
@@ -38,10 +131,12 @@ document.addEventListener("DOMContentLoaded", () => {
     btn.addEventListener("click", () => gen(btn.dataset.bid));
   });
 
-function renderMCQs(bid, mcqs) {
-  const host = document.getElementById(`mcq-${bid}`);
-  host.innerHTML = "";
-  mcqs.forEach((q, i) => {
+function mcqHost(bid) {
+  // per-block list if the template has one, else the shared right-hand panel
+  return document.getElementById(`mcq-${bid}`) || document.querySelector(".mcq-list");
+}
+
+function appendMCQ(host, bid, q, i) {
     const wrap = document.createElement("div");
     wrap.className = "mcq-item";
     const opts = q.options.map((o, j) => `<div class="opt">${String.fromCharCode(65+j)}. ${o}</div>`).join("");
@@ -76,15 +171,37 @@ function renderMCQs(bid, mcqs) {
       if (vis) { ans.removeAttribute("hidden"); showBtn.textContent = "Hide answer"; }
       else { ans.setAttribute("hidden",""); showBtn.textContent = "Show answer"; }
     });
-  });
 }
 
-  function gen(bid) {
-    const out = document.getElementById(`mcq-${bid}`);
+  // Streams NDJSON from /mcq/{bid}/stream so the first question shows before the rest are done.
+  async function gen(bid) {
+    const out = mcqHost(bid);
     out.textContent = "Generating…";
-    fetch(`/session/${sid}/mcq/${bid}`, { method: "POST" })
-      .then(r => r.json())
-      .then(js => renderMCQs(bid, js))
-      .catch(() => out.textContent = "Failed to generate.");
+    let n = 0;
+    const add = (line) => {
+      if (!line.trim()) return;
+      const q = JSON.parse(line);
+      if (q.done) { console.debug(`MCQs: first after ${q.ttfq_ms}ms, all after ${q.total_ms}ms`); return; }
+      if (n === 0) out.innerHTML = "";
+      appendMCQ(out, bid, q, n++);
+    };
+    try {
+      const r = await fetch(`/session/${sid}/mcq/${bid}/stream`, { method: "POST" });
+      const reader = r.body.getReader();
+      const dec = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += dec.decode(value, { stream: true });
+        const lines = buf.split("\n");
+        buf = lines.pop();
+        lines.forEach(add);
+      }
+      add(buf);
+      if (n === 0) out.textContent = "No questions generated.";
+    } catch (e) {
+      if (n === 0) out.textContent = "Failed to generate.";
+    }
   }
 });
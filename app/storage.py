@@ -1,11 +1,30 @@
-import json, os, uuid
-from typing import Dict
+import json, os, re, uuid, hashlib, threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from .models import Session
 
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
 DATA_DIR = os.path.join(os.getcwd(), "uploads")
 SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
+# Layout:
+#   sessions/<id[:2]>/<id>.json                         full session, sharded by id prefix
+#   sessions/<id[:2]>/<id>.fragments.json               every fragment of the notes, for search
+#   sessions/<id[:2]>/<id>.lock                         flock()ed around read-modify-write
+#   sessions/_by_date/<YYYY>/<MM>/<YYYYMMDDHHMM>_<id>.json  {"id", "name", "created_at"}
+#   sessions/_by_name/<hash of lowercased name>.json       {"id"}
+# The dated entries let listings walk newest-first and stop after one page
+# without opening (or even listing) every session; the name entries make the
+# unique-name check a single stat.
+BY_DATE_DIR = os.path.join(SESSIONS_DIR, "_by_date")
+BY_NAME_DIR = os.path.join(SESSIONS_DIR, "_by_name")
+
 BASE = os.getcwd()
 UPLOADS = os.path.join(BASE, "uploads")
 os.makedirs(UPLOADS, exist_ok=True)
@@ -32,16 +51,204 @@ def save_exams(exams):
 def new_exam_id():
     return uuid.uuid4().hex[:12]
 
+def _session_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, session_id[:2], f"{session_id}.json")
+
+def _fragments_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, session_id[:2], f"{session_id}.fragments.json")
+
+def _lock_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, session_id[:2], f"{session_id}.lock")
+
+def _legacy_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, f"{session_id}.json")
+
+def _created_key(created_at: str) -> str:
+    """'2025-09-22 17:14' -> '202509221714'; unparseable dates sort oldest."""
+    digits = re.sub(r"\D", "", created_at or "")[:12]
+    return digits if len(digits) == 12 else "0" * 12
+
+def _meta_path(sess_id: str, created_at: str) -> str:
+    key = _created_key(created_at)
+    return os.path.join(BY_DATE_DIR, key[:4], key[4:6], f"{key}_{sess_id}.json")
+
+def _name_path(name: str) -> str:
+    digest = hashlib.sha1((name or "").strip().lower().encode("utf-8")).hexdigest()[:20]
+    return os.path.join(BY_NAME_DIR, f"{digest}.json")
+
+def name_taken(name: str) -> bool:
+    return os.path.isfile(_name_path(name))
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)  # readers never see a half-written file
+
 def save_session(sess: Session):
-    path = os.path.join(SESSIONS_DIR, f"{sess.id}.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(sess.dict(), f, ensure_ascii=False, indent=2)
+    _write_json(_session_path(sess.id), sess.dict())
+    try:
+        os.remove(_legacy_path(sess.id))  # the sharded copy is now the newer one
+    except FileNotFoundError:
+        pass
+    meta = _meta_path(sess.id, sess.created_at)
+    if not os.path.isfile(meta):
+        _write_json(meta, {"id": sess.id, "name": sess.name, "created_at": sess.created_at})
+        _write_json(_name_path(sess.name), {"id": sess.id})
+
+def save_fragments(session_id: str, texts: List[str]):
+    """Blocks only keep their top few fragments; search covers all of them."""
+    with _session_lock(session_id):
+        if os.path.isfile(_session_path(session_id)) or os.path.isfile(_legacy_path(session_id)):
+            _write_json(_fragments_path(session_id), texts)  # not for a session deleted meanwhile
+
+def load_fragments(session_id: str) -> Optional[List[str]]:
+    try:
+        with open(_fragments_path(session_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None  # still refining, or saved before fragments were kept
+
+def fragments_version(session_id: str) -> Optional[int]:
+    try:
+        return os.stat(_fragments_path(session_id)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+@contextmanager
+def _session_lock(session_id: str):
+    """
+    Exclusive per-session lock that also holds across processes (uvicorn
+    --workers, app.batch), via flock() on a lock file next to the session.
+    Falls back to an in-process lock where fcntl is missing.
+    """
+    if fcntl is None:
+        with _locks[session_id]:
+            yield
+        return
+    path = _lock_path(session_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def update_session(session_id: str, fn: Callable[[Session], None]) -> Session:
+    """
+    Load, modify in place with fn, save — serialized per session so concurrent
+    writers don't drop each other's changes. Blocks while another writer holds
+    the lock, so call it from a thread (run_in_threadpool), not the event loop.
+    """
+    with _session_lock(session_id):
+        sess = load_session(session_id)
+        fn(sess)
+        save_session(sess)
+        return sess
 
 def load_session(session_id: str) -> Session:
-    path = os.path.join(SESSIONS_DIR, f"{session_id}.json")
+    path = _session_path(session_id)
+    if not os.path.isfile(path):
+        path = _legacy_path(session_id)  # not migrated yet
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     return Session(**data)
 
+def delete_session(session_id: str):
+    """
+    Under the session lock, so an update_session in flight (e.g. refinement
+    after /start) either finishes first or finds the session gone, instead of
+    writing it back. The lock file itself stays: unlinking it would let later
+    lockers flock() a fresh inode and skip past a holder of the old one.
+    """
+    with _session_lock(session_id):
+        try:
+            sess = load_session(session_id)
+        except FileNotFoundError:
+            return
+        paths = [_meta_path(sess.id, sess.created_at), _session_path(session_id), _legacy_path(session_id),
+                 _fragments_path(session_id)]
+        try:
+            with open(_name_path(sess.name), "r", encoding="utf-8") as f:
+                if json.load(f).get("id") == session_id:
+                    paths.append(_name_path(sess.name))
+        except Exception:
+            pass
+        for p in paths:
+            if os.path.isfile(p):
+                os.remove(p)
+
+def _desc_dirs(path: str) -> List[str]:
+    if not os.path.isdir(path):
+        return []
+    return sorted((d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))), reverse=True)
+
+def iter_session_meta(before: Optional[str] = None) -> Iterator[Tuple[str, Dict]]:
+    """(cursor, meta) newest first, starting strictly after cursor `before`."""
+    for year in _desc_dirs(BY_DATE_DIR):
+        if before and year > before[:4]:
+            continue
+        for month in _desc_dirs(os.path.join(BY_DATE_DIR, year)):
+            if before and year + month > before[:6]:
+                continue
+            d = os.path.join(BY_DATE_DIR, year, month)
+            for fn in sorted((f for f in os.listdir(d) if f.endswith(".json")), reverse=True):
+                key = fn[:-5]
+                if before and key >= before:
+                    continue
+                try:
+                    with open(os.path.join(d, fn), "r", encoding="utf-8") as f:
+                        yield key, json.load(f)
+                except Exception:
+                    pass
+
+def list_sessions(limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """One page of session metadata, newest first, and the cursor for the next page (None at the end)."""
+    items, last = [], None
+    for key, meta in iter_session_meta(before=cursor):
+        if len(items) == limit:
+            return items, last
+        items.append(meta)
+        last = key
+    return items, None
+
+def migrate_flat_layout() -> int:
+    """
+    Move sessions/<id>.json into the sharded layout and index them by date.
+    Safe to re-run, and to run from several workers at once. An id that
+    already has a sharded file is never overwritten: that copy is the newer one.
+    """
+    moved = 0
+    for fn in sorted(os.listdir(SESSIONS_DIR)):
+        path = os.path.join(SESSIONS_DIR, fn)
+        if not (fn.endswith(".json") and os.path.isfile(path)):
+            continue
+        if _migrate_one(fn[:-5], path):
+            moved += 1
+    return moved
+
+def _migrate_one(sid: str, path: str) -> bool:
+    # locked, so an update_session that already moved this id can't be overwritten by the flat copy
+    with _session_lock(sid):
+        if os.path.isfile(_session_path(sid)):
+            try:
+                os.remove(path)  # stale leftover
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sess = Session(**json.load(f))
+        except FileNotFoundError:
+            return False  # another worker got it
+        except Exception:
+            return False  # leave unreadable files where they are
+        save_session(sess)  # also removes the flat file
+        return True
+
 def new_session_id() -> str:
     return uuid.uuid4().hex[:12]
\ No newline at end of file
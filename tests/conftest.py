@@ -0,0 +1,11 @@
+import pytest
+
+from app import storage
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    """Point storage at an empty sessions directory."""
+    monkeypatch.setattr(storage, "SESSIONS_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "BY_DATE_DIR", str(tmp_path / "_by_date"))
+    monkeypatch.setattr(storage, "BY_NAME_DIR", str(tmp_path / "_by_name"))
+    return tmp_path
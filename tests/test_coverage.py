@@ -0,0 +1,52 @@
+"""Syllabus coverage: toggling blocks on and off, and the per-session cache."""
+from app import coverage
+from app.models import Fragment, PlanBlock, Session
+
+def _session(sid="cov000000001"):
+    return Session(id=sid, name="Coverage", syllabus_topics=["Price elasticity of demand", "Consumer surplus"], blocks=[
+        PlanBlock(id="b1", title="Elasticity", minutes=10,
+                  fragments=[Fragment(doc_id="notes", text="Price elasticity of demand measures responsiveness.")]),
+        PlanBlock(id="b2", title="Welfare", minutes=10,
+                  fragments=[Fragment(doc_id="notes", text="Consumer surplus is what buyers gain beyond what they pay.")]),
+        PlanBlock(id="b3", title="History", minutes=5,
+                  fragments=[Fragment(doc_id="notes", text="Adam Smith wrote about markets.")]),
+    ])
+
+def _done(sess):
+    return {t: done for t, _, done in coverage.syllabus_status(sess)}
+
+def test_toggle_on_and_off():
+    sess = _session()
+    assert _done(sess) == {"Price elasticity of demand": False, "Consumer surplus": False}
+
+    sess.blocks[0].covered = True
+    assert _done(sess) == {"Price elasticity of demand": True, "Consumer surplus": False}
+    assert [m["topic"] for m in coverage.missed_topics(sess)] == ["Consumer surplus"]
+
+    sess.blocks[1].covered = True
+    sess.blocks[0].covered = False
+    assert _done(sess) == {"Price elasticity of demand": False, "Consumer surplus": True}
+
+    sess.blocks[1].covered = False
+    assert _done(sess) == {"Price elasticity of demand": False, "Consumer surplus": False}
+    assert coverage.get_index(sess) is coverage.get_index(sess)  # scores computed once
+
+def test_interleaved_snapshots_share_no_covered_state():
+    # two requests holding different snapshots of the same session, answered in any order
+    on, off = _session(), _session()
+    on.blocks[0].covered = True
+    assert _done(on)["Price elasticity of demand"]
+    assert not _done(off)["Price elasticity of demand"]
+    assert _done(on)["Price elasticity of demand"]
+
+def test_block_order_follows_syllabus():
+    sess = _session()
+    assert coverage.block_order(sess) == ["b1", "b2", "b3"]
+    sess.syllabus_topics = ["Consumer surplus", "Price elasticity of demand"]
+    assert coverage.block_order(sess) == ["b2", "b1", "b3"]
+
+def test_cache_is_bounded():
+    for i in range(coverage._INDEX.maxsize + 10):
+        coverage.get_index(_session(f"lru{i:09d}"))
+    assert len(coverage._INDEX) == coverage._INDEX.maxsize
+    coverage.forget("lru000000000")
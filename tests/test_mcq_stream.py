@@ -0,0 +1,98 @@
+"""
+MCQ streaming against app.fake_llm on a free port: the parser, the llm
+generator and the NDJSON route. Run from the repo root: python -m pytest
+"""
+import json, time, asyncio, threading
+
+import pytest
+
+from app import fake_llm, llm, storage
+from app.models import Fragment, PlanBlock, Session
+
+DELAY = 0.01  # between 12-char pieces: roughly 0.2s per MCQ
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    server = fake_llm.serve(0, DELAY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _assert_incremental(stamps):
+    """One arrival per MCQ, spread over the completion rather than all at the end."""
+    assert len(stamps) == len(fake_llm.CANNED)
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert min(gaps) > DELAY * 5, gaps
+
+# --- JSONObjectStream
+
+def test_objects_come_out_as_they_close():
+    p = llm.JSONObjectStream()
+    assert p.feed('```json\n[{"a": 1') == []
+    assert p.feed('}, {"a"') == [{"a": 1}]
+    assert p.feed(': 2}]\n```') == [{"a": 2}]
+
+def test_braces_inside_strings_are_not_structure():
+    p = llm.JSONObjectStream()
+    assert p.feed('[{"q": "is {x} a set?", "o": ["}", "{{"]}, ') == [{"q": "is {x} a set?", "o": ["}", "{{"]}]
+    assert p.feed('{"q": "done"}]') == [{"q": "done"}]
+
+def test_escaped_quotes_inside_strings():
+    p = llm.JSONObjectStream()
+    text = '[{"q": "what does \\"{\\" open?", "a": "a \\\\"}, {"q": "next"}]'
+    out = []
+    for ch in text:  # split at every possible point, escapes included
+        out += p.feed(ch)
+    assert out == [{"q": 'what does "{" open?', "a": "a \\"}, {"q": "next"}]
+
+def test_nested_objects_and_malformed_items():
+    p = llm.JSONObjectStream()
+    assert p.feed('[{"a": {"b": {}}}, {"a": 1,}, {"c": 3}]') == [{"a": {"b": {}}}, {"c": 3}]
+
+# --- streaming through the fake completions server
+
+def test_stream_mcqs_from_notes_yields_incrementally(fake_openai):
+    stamps, got = [], []
+    for q in llm.stream_mcqs_from_notes("Elasticity", ["Price elasticity of demand."], n=4):
+        stamps.append(time.perf_counter())
+        got.append(q)
+    assert got == fake_llm.CANNED
+    _assert_incremental(stamps)
+
+def test_stream_route_sends_each_mcq_then_done(fake_openai, sessions_dir):
+    from app.main import app
+    sess = Session(id="stream000001", name="Stream test", blocks=[
+        PlanBlock(id="b1", title="Elasticity", minutes=10,
+                  fragments=[Fragment(doc_id="notes", text="Price elasticity of demand.")])])
+    storage.save_session(sess)
+
+    chunks = []
+    async def call():
+        sent = False
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.sleep(3600)  # no disconnect while streaming
+        async def send(message):
+            if message["type"] == "http.response.start":
+                assert message["status"] == 200
+            elif message["type"] == "http.response.body" and message.get("body"):
+                chunks.append((time.perf_counter(), message["body"].decode()))
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": f"/session/{sess.id}/mcq/b1/stream", "raw_path": b"",
+                 "query_string": b"", "root_path": "", "headers": [(b"host", b"test")],
+                 "client": ("127.0.0.1", 1), "server": ("test", 80)}
+        await app(scope, receive, send)
+    asyncio.run(call())
+
+    lines = [(t, json.loads(ln)) for t, body in chunks for ln in body.splitlines() if ln.strip()]
+    mcqs, (_, done) = lines[:-1], lines[-1]
+    assert [q for _, q in mcqs] == fake_llm.CANNED
+    _assert_incremental([t for t, _ in mcqs])
+    assert done["done"] is True
+    assert 0 < done["ttfq_ms"] < done["total_ms"]
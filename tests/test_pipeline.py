@@ -0,0 +1,35 @@
+"""Exam focus during refinement must not undo what the teacher did meanwhile."""
+from datetime import date, timedelta
+
+from app.models import PlanBlock, Session
+from app.pipeline import apply_exam_focus
+
+EXAMS = [{"id": "e1", "title": "Midterm", "date": (date.today() + timedelta(days=7)).isoformat(),
+          "topics": ["Budgets"]}]
+
+def _session():
+    return Session(id="pipe00000001", name="Pipeline", blocks=[
+        PlanBlock(id="b1", title="Demand", minutes=10),
+        PlanBlock(id="b2", title="Supply", minutes=10),
+        PlanBlock(id="b3", title="Budgets", minutes=10),
+    ])
+
+def test_untouched_plan_puts_exam_topics_first():
+    sess = _session()
+    apply_exam_focus(sess, EXAMS, ["b1", "b2", "b3"])
+    assert [b.id for b in sess.blocks] == ["b3", "b1", "b2"]
+    assert sess.blocks[0].minutes > sess.blocks[1].minutes
+
+def test_teacher_reorder_is_kept_minutes_still_shift():
+    sess = _session()
+    sess.blocks = [sess.blocks[1], sess.blocks[0], sess.blocks[2]]  # e.g. "Order by syllabus"
+    apply_exam_focus(sess, EXAMS, ["b1", "b2", "b3"])
+    assert [b.id for b in sess.blocks] == ["b2", "b1", "b3"]
+    assert sess.blocks[2].minutes > sess.blocks[0].minutes
+    assert sum(b.minutes for b in sess.blocks) == 30
+
+def test_covered_block_keeps_order():
+    sess = _session()
+    sess.blocks[0].covered = True
+    apply_exam_focus(sess, EXAMS, ["b1", "b2", "b3"])
+    assert [b.id for b in sess.blocks] == ["b1", "b2", "b3"]
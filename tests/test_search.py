@@ -0,0 +1,21 @@
+"""Fragment lookup: exact sparse index and the opt-in dense one return top_k rows alike."""
+from app.dense import DenseIndex
+from app.planner import FragmentIndex, build_fragment_index, map_fragments_to_topic
+
+TEXTS = ["alpha beta", "gamma delta", "beta gamma", "the and"]
+
+def test_dense_probes_further_partitions_until_k():
+    idx = DenseIndex(TEXTS)
+    assert idx.nprobe < idx.nlist
+    assert len(idx.search("beta", 2)) == 2
+    assert sorted(idx.search("beta", 10)) == [0, 1, 2, 3]
+
+def test_dense_and_exact_agree_on_count():
+    dense = build_fragment_index(TEXTS, min_fragments=1)
+    assert isinstance(dense, DenseIndex)
+    exact = map_fragments_to_topic(TEXTS, "beta", top_k=2)
+    assert len(map_fragments_to_topic(TEXTS, "beta", top_k=2, index=dense)) == len(exact) == 2
+    assert set(exact) == {"alpha beta", "beta gamma"}
+
+def test_exact_index_handles_stop_word_only_notes():
+    assert FragmentIndex(["the and", "of the"]).search("beta", 2) == []
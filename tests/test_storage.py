@@ -0,0 +1,75 @@
+"""Sharded session storage: cursor pagination, migration re-runs, delete."""
+import json, os
+
+from app import storage
+from app.models import PlanBlock, Session
+
+def _session(sid, created_at, name=None):
+    return Session(id=sid, name=name or f"Session {sid}", created_at=created_at,
+                   blocks=[PlanBlock(id="b1", title="Topic", minutes=10)])
+
+def _all_pages(limit):
+    pages, cursor = [], None
+    while True:
+        items, cursor = storage.list_sessions(limit=limit, cursor=cursor)
+        pages.append([m["id"] for m in items])
+        if cursor is None:
+            return pages
+
+def test_pages_newest_first_with_same_minute_ties(sessions_dir):
+    created = {
+        "aa0000000001": "2024-12-31 23:59",
+        "bb0000000001": "2025-01-01 09:00",
+        "bb0000000002": "2025-01-01 09:00",
+        "bb0000000003": "2025-01-01 09:00",
+        "cc0000000001": "2025-02-10 08:30",
+    }
+    for sid, at in created.items():
+        storage.save_session(_session(sid, at))
+
+    expected = ["cc0000000001", "bb0000000003", "bb0000000002", "bb0000000001", "aa0000000001"]
+    assert _all_pages(2) == [expected[0:2], expected[2:4], expected[4:]]  # boundary inside the tie
+    assert _all_pages(5) == [expected]
+    assert _all_pages(100) == [expected]
+
+def test_exact_last_page_ends_with_no_cursor(sessions_dir):
+    for i in range(4):
+        storage.save_session(_session(f"dd000000000{i}", f"2025-03-0{i + 1} 12:00"))
+    first, cursor = storage.list_sessions(limit=2)
+    second, end = storage.list_sessions(limit=2, cursor=cursor)
+    assert len(first) == len(second) == 2
+    assert end is None
+    assert storage.list_sessions(limit=2, cursor="000000000000_x") == ([], None)
+
+def test_migration_is_idempotent_and_never_overwrites_sharded(sessions_dir):
+    flat = _session("ee0000000001", "2025-01-05 10:00", name="Legacy")
+    with open(storage._legacy_path(flat.id), "w", encoding="utf-8") as f:
+        json.dump(flat.dict(), f)
+    assert storage.load_session(flat.id).name == "Legacy"  # readable before migrating
+    assert not storage.name_taken("legacy")
+
+    # a newer sharded copy next to a stale flat one: the flat one must lose
+    newer = _session("ee0000000002", "2025-01-06 10:00")
+    newer.blocks[0].covered = True
+    storage.save_session(newer)
+    stale = newer.copy(deep=True)
+    stale.blocks[0].covered = False
+    with open(storage._legacy_path(newer.id), "w", encoding="utf-8") as f:
+        json.dump(stale.dict(), f)
+
+    assert storage.migrate_flat_layout() == 1
+    assert storage.migrate_flat_layout() == 0
+    assert storage.load_session(newer.id).blocks[0].covered
+    assert not os.path.exists(storage._legacy_path(flat.id))
+    assert not os.path.exists(storage._legacy_path(newer.id))
+    assert storage.name_taken("legacy")
+    assert [m["id"] for m in storage.list_sessions()[0]] == [newer.id, flat.id]
+
+def test_delete_removes_listing_and_name(sessions_dir):
+    sess = _session("ff0000000001", "2025-04-01 10:00", name="Gone")
+    storage.save_session(sess)
+    storage.save_fragments(sess.id, ["a fragment"])
+    storage.delete_session(sess.id)
+    assert storage.list_sessions() == ([], None)
+    assert not storage.name_taken("Gone")
+    assert storage.load_fragments(sess.id) is None